@@ -0,0 +1,103 @@
+import asyncio
+import rich
+import typer
+
+from benchmarks.load import (
+    LOAD_SCENARIOS,
+    run_load
+)
+from benchmarks.results import (
+    compare_results,
+    load_results,
+    save_results
+)
+from rich.table import Table
+from typing import Any
+
+
+app = typer.Typer()
+
+REPORT_COLUMNS = ("count", "errors", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "per_second")
+
+
+def _print_results(title: str, results: dict[str, dict[str, Any]]) -> None:
+    table = Table(title=title)
+    table.add_column("benchmark", no_wrap=True)
+    for column in REPORT_COLUMNS:
+        table.add_column(column, justify="right")
+    for name, result in results.items():
+        table.add_row(name, *(
+            f"{result[column]:.3f}" if isinstance(result[column], float) else str(result[column])
+            for column in REPORT_COLUMNS
+        ))
+    rich.print(table)
+
+
+@app.command()
+def micro(
+    output: str = typer.Option("benchmark-micro.json", help="JSON file for the results"),
+    hash_iterations: int = typer.Option(20, min=1, help="Calls of hash_password and verify_password"),
+    token_iterations: int = typer.Option(2000, min=1, help="Calls of the token functions"),
+) -> None:
+    from benchmarks.micro import run_microbenchmarks
+
+    results = run_microbenchmarks(hash_iterations, token_iterations)
+    _print_results("security microbenchmarks", results)
+    save_results(output, "micro", results, hash_iterations=hash_iterations, token_iterations=token_iterations)
+    rich.print(f"[green][bold]Results saved to {output}[/bold][/green]")
+
+
+@app.command()
+def load(
+    scenario: list[str] | None = typer.Option(
+        None,
+        help=f"Scenarios to run: {', '.join(LOAD_SCENARIOS)}. All by default, admin_users only with admin credentials"
+    ),
+    concurrency: int = typer.Option(32, min=1, help="Requests in flight at once"),
+    duration: float = typer.Option(10.0, min=0.1, help="Seconds to run every scenario"),
+    base_url: str | None = typer.Option(None, help="Server to load, e.g. http://127.0.0.1:8000. Runs main.app in-process by default"),
+    admin_email: str | None = typer.Option(None, help="Admin account for the admin_users scenario"),
+    admin_password: str | None = typer.Option(None, help="Password of the admin account"),
+    output: str = typer.Option("benchmark-load.json", help="JSON file for the results"),
+) -> None:
+    has_admin = admin_email is not None and admin_password is not None
+    if not scenario:
+        scenario = [name for name in LOAD_SCENARIOS if name != "admin_users" or has_admin]
+    unknown = set(scenario) - set(LOAD_SCENARIOS)
+    if unknown:
+        rich.print(f"[red][bold]Unknown scenarios: {', '.join(sorted(unknown))}[/bold][/red]")
+        raise typer.Exit(code=1)
+    # Checked up front so a missing login cannot end the run after the other
+    # scenarios, before anything is saved.
+    if "admin_users" in scenario and not has_admin:
+        rich.print("[red][bold]The admin_users scenario needs --admin-email and --admin-password[/bold][/red]")
+        raise typer.Exit(code=1)
+    results = asyncio.run(run_load(scenario, concurrency, duration, base_url, admin_email, admin_password))
+    _print_results(f"load, concurrency {concurrency}", results)
+    save_results(output, "load", results, concurrency=concurrency, duration=duration, base_url=base_url)
+    rich.print(f"[green][bold]Results saved to {output}[/bold][/green]")
+
+
+@app.command()
+def compare(
+    baseline: str = typer.Argument(..., help="Results of the reference commit"),
+    current: str = typer.Argument(..., help="Results to check"),
+    metric: str = typer.Option("p95_ms", help=f"One of: {', '.join(REPORT_COLUMNS[2:])}"),
+    threshold: float = typer.Option(0.1, help="Relative change counted as a regression"),
+) -> None:
+    baseline_report, current_report = load_results(baseline), load_results(current)
+    # Throughput regresses when it drops, latency when it grows.
+    sign = -1 if metric == "per_second" else 1
+    regressions = 0
+    rich.print(f"{baseline_report['commit']} -> {current_report['commit']} ({metric})")
+    for name, old, new, change in compare_results(baseline_report, current_report, metric):
+        regressed = sign * change > threshold
+        regressions += regressed
+        color = "red" if regressed else "green"
+        rich.print(f"[{color}]{name:<24} {old:>12.3f} {new:>12.3f} {change:+8.1%}[/{color}]")
+    if regressions:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,149 @@
+import asyncio
+import http.cookiejar
+import httpx
+import itertools
+import sys
+import time
+import uuid
+
+from benchmarks.results import summarize
+from collections import Counter
+from collections.abc import (
+    Awaitable,
+    Callable
+)
+from typing import Any
+
+
+LOAD_SCENARIOS = ("login", "register", "my_items", "admin_users")
+BENCHMARK_PASSWORD = "benchmark-password"
+
+Send = Callable[[int], Awaitable[httpx.Response]]
+
+
+def _create_client(base_url: str, app=None) -> httpx.AsyncClient:
+    # Cookies are passed explicitly per request. A jar that accepts nothing
+    # keeps concurrent workers from sharing tokens and keeps login requests
+    # from taking the "already logged in" shortcut.
+    jar = http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    return httpx.AsyncClient(transport=transport, base_url=base_url, cookies=jar, timeout=30.0)
+
+
+async def _login(client: httpx.AsyncClient, email: str, password: str) -> dict[str, str]:
+    response = await client.post("/user/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Cookie": f"access_token={response.cookies['access_token']}"}
+
+
+async def _register(client: httpx.AsyncClient, username: str, email: str) -> httpx.Response:
+    return await client.post("/user/register", json={
+        "username": username,
+        "email": email,
+        "password": BENCHMARK_PASSWORD,
+        "confirm_password": BENCHMARK_PASSWORD
+    })
+
+
+async def _prepare(
+    client: httpx.AsyncClient,
+    scenario: str,
+    admin_email: str | None,
+    admin_password: str | None
+) -> Send:
+    run_id = uuid.uuid4().hex[:8]
+    if scenario == "register":
+        return lambda n: _register(client, f"bench-{n}", f"bench-{run_id}-{n}@example.com")
+    if scenario == "admin_users":
+        if not admin_email or not admin_password:
+            raise ValueError("The admin_users scenario needs --admin-email and --admin-password")
+        headers = await _login(client, admin_email, admin_password)
+        return lambda n: client.get("/admin/users", params={"limit": 50}, headers=headers)
+
+    email = f"bench-{run_id}@example.com"
+    (await _register(client, "bench", email)).raise_for_status()
+    if scenario == "login":
+        return lambda n: client.post("/user/login", json={"email": email, "password": BENCHMARK_PASSWORD})
+    headers = await _login(client, email, BENCHMARK_PASSWORD)
+    return lambda n: client.get("/my_items", headers=headers)
+
+
+async def _run_scenario(send: Send, concurrency: int, duration: float) -> dict[str, Any]:
+    # Closed loop: every worker sends its next request as soon as the
+    # previous one finishes, until the time is up.
+    latencies = []
+    statuses = Counter()
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await send(next(counter))
+                status_code = response.status_code
+            except httpx.HTTPError as e:
+                status_code = type(e).__name__
+            statuses[str(status_code)] += 1
+            if isinstance(status_code, int) and status_code < 400:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - started, errors=statuses.total() - len(latencies))
+    result["statuses"] = dict(statuses)
+    return result
+
+
+async def _run_scenarios(
+    client: httpx.AsyncClient,
+    scenarios: list[str],
+    concurrency: int,
+    duration: float,
+    admin_email: str | None,
+    admin_password: str | None
+) -> dict[str, dict[str, Any]]:
+    results = {}
+    for scenario in scenarios:
+        send = await _prepare(client, scenario, admin_email, admin_password)
+        results[scenario] = await _run_scenario(send, concurrency, duration)
+    return results
+
+
+async def run_load(
+    scenarios: list[str],
+    concurrency: int,
+    duration: float,
+    base_url: str | None = None,
+    admin_email: str | None = None,
+    admin_password: str | None = None
+) -> dict[str, dict[str, Any]]:
+    if base_url is not None:
+        # A separate server keeps its own login throttle; start it with
+        # LOGIN_MAX_ATTEMPTS_PER_IP/EMAIL raised for the login scenario.
+        async with _create_client(base_url) as client:
+            return await _run_scenarios(client, scenarios, concurrency, duration, admin_email, admin_password)
+
+    # In-process runs go through the full app, lifespan included, against the
+    # database from the environment. The throttle is kept but never trips.
+    from main import app
+    from ratelimit import (
+        InMemoryRateLimitBackend,
+        LoginThrottle,
+        get_login_throttle
+    )
+
+    throttle = LoginThrottle(
+        backend=InMemoryRateLimitBackend(),
+        max_attempts_per_ip=sys.maxsize,
+        max_attempts_per_email=sys.maxsize,
+        window_seconds=1,
+        backoff_base_seconds=0,
+        backoff_max_seconds=0
+    )
+    app.dependency_overrides[get_login_throttle] = lambda: throttle
+    try:
+        async with app.router.lifespan_context(app), _create_client("https://benchmark", app) as client:
+            return await _run_scenarios(client, scenarios, concurrency, duration, admin_email, admin_password)
+    finally:
+        app.dependency_overrides.pop(get_login_throttle, None)
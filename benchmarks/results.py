@@ -0,0 +1,71 @@
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+
+from typing import Any
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict[str, Any]:
+    # Latencies are in seconds; the report uses milliseconds.
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": p50 * 1000,
+        "p95_ms": p95 * 1000,
+        "p99_ms": p99 * 1000,
+        "per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path: str, kind: str, results: dict[str, dict[str, Any]], **params: Any) -> None:
+    report = {
+        "kind": kind,
+        "commit": _git_commit(),
+        "created_at": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load_results(path: str) -> dict[str, Any]:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_results(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    metric: str = "p95_ms"
+) -> list[tuple[str, float, float, float]]:
+    # (name, baseline value, current value, relative change) for every
+    # benchmark present in both reports.
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        old, new = before[metric], result[metric]
+        change = (new - old) / old if old else 0.0
+        rows.append((name, old, new, change))
+    return rows
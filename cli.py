@@ -1,34 +1,43 @@
 import asyncio
+import contextlib
+import csv
+import importlib.util
+import json
+import os
 import rich
+import statistics
+import subprocess
+import sys
+import time
 import typer
 
-from db.database import (
-    async_session_maker,
-    engine
-)
-from db.models import (
-    User,
-    Base
-)
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pydantic import (
     BaseModel, 
     EmailStr, 
     ValidationError
 )
-from security import hash_password
-from sqlalchemy import (
-    select, 
-    delete
-)
+from schemas.users import UserRegister
+from typing import Any
+
+# Settings, the database stack, security and cryptography are imported
+# inside the commands that use them, so --help and the commands that need
+# none of them start fast. "cli.py import-time" keeps an eye on it.
+
 
+async def apply_migrations(force: bool = False):
+    from db.database import engine
+    from db.migrations import run_migrations
 
-async def create_tables_if_not_exist():
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        rich.print("[green][bold]Tables created successfully![/bold][/green]")
+        applied = await run_migrations(engine, force=force)
+        for migration in applied:
+            rich.print(f"[green][bold]Applied migration {migration.version}: {migration.name}[/bold][/green]")
+        if not applied:
+            rich.print("[green][bold]Database schema is up to date![/bold][/green]")
     except Exception as e:
-        rich.print(f"[red][bold]Error creating tables: {e}[/bold][/red]")
+        rich.print(f"[red][bold]Error applying migrations: {e}[/bold][/red]")
         raise
 
 class EmailValidate(BaseModel):
@@ -44,9 +53,20 @@ async def superadmin_create(
     password: str, 
     confirm_password: str
 ) -> None:
+    from db.database import async_session_maker
+    from db.models import User
+    from security import (
+        hash_password_async,
+        password_hashing_pool
+    )
+    from sqlalchemy import (
+        delete,
+        select
+    )
+
     async with async_session_maker() as session:
         try:
-            await create_tables_if_not_exist()
+            await apply_migrations()
             
             EmailValidate(email=email)
 
@@ -70,7 +90,7 @@ async def superadmin_create(
             
             db_superadmin = User(
                 username=username,
-                password=hash_password(password),
+                password=await hash_password_async(password),
                 email=email,
                 role="superadmin"
             )
@@ -85,6 +105,7 @@ async def superadmin_create(
             rich.print(f"[red][bold]Error {e}[/bold][/red]")
         finally:
             await session.close()
+            password_hashing_pool.shutdown()
 
 
 @app.command()
@@ -97,6 +118,431 @@ def create_superadmin(
     asyncio.run(superadmin_create(username, email, password, confirm_password))
 
 
+@app.command()
+def migrate(
+    force: bool = typer.Option(False, help="Check every migration even if the stored schema fingerprint matches"),
+) -> None:
+    asyncio.run(apply_migrations(force))
+
+
+@app.command()
+def calibrate_hasher(
+    algorithm: str = typer.Option("bcrypt", help="Password hasher to calibrate: bcrypt or scrypt"),
+    target_ms: float = typer.Option(250.0, help="Target time of one hash in milliseconds"),
+    samples: int = typer.Option(3, min=1, help="Hashes timed for every cost"),
+) -> None:
+    from hashers import HASHERS
+
+    hasher_cls = HASHERS.get(algorithm)
+    if hasher_cls is None:
+        rich.print(f"[red][bold]Unknown hasher {algorithm}! Choose one of: {', '.join(HASHERS)}[/bold][/red]")
+        raise typer.Exit(code=1)
+    
+    chosen_cost = None
+    for cost in range(hasher_cls.min_cost, hasher_cls.max_cost + 1):
+        hasher = hasher_cls(cost)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.hash("calibration-password")
+            timings.append(time.perf_counter() - start)
+        elapsed_ms = statistics.median(timings) * 1000
+        rich.print(f"cost={cost}: {elapsed_ms:.1f} ms")
+        # Every step doubles the work, so stop at the first cost over target.
+        if elapsed_ms > target_ms:
+            break
+        chosen_cost = cost
+    
+    if chosen_cost is None:
+        chosen_cost = hasher_cls.min_cost
+        rich.print(f"[yellow][bold]Even the minimum cost is slower than {target_ms} ms on this host[/bold][/yellow]")
+    rich.print(f"[green][bold]Add to .env:[/bold][/green]\nPASSWORD_HASHER={algorithm}\nPASSWORD_HASH_COST={chosen_cost}")
+
+
+@app.command()
+def generate_signing_key(
+    kid: str = typer.Argument(..., help="Key id. The newest id in sort order becomes active, e.g. 2026-10"),
+    algorithm: str | None = typer.Option(None, help="EdDSA, RS256 or ES256. Defaults to JWT_ALGORITHM"),
+    directory: str | None = typer.Option(None, help="Directory with the signing keys. Defaults to JWT_KEYS_DIR"),
+) -> None:
+    from config import settings
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import (
+        ec,
+        ed25519,
+        rsa
+    )
+
+    algorithm = algorithm or settings.JWT_ALGORITHM
+    directory = directory or settings.JWT_KEYS_DIR
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm.startswith(("RS", "PS")):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=3072)
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        rich.print(f"[red][bold]Unsupported algorithm {algorithm}![/bold][/red]")
+        raise typer.Exit(code=1)
+    
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    rich.print(f"[green][bold]Signing key {path} created![/bold][/green]")
+
+
+@app.command()
+def retire_signing_key(
+    kid: str = typer.Argument(..., help="Key id to stop signing with"),
+    directory: str | None = typer.Option(None, help="Directory with the signing keys. Defaults to JWT_KEYS_DIR"),
+) -> None:
+    from config import settings
+    from cryptography.hazmat.primitives import serialization
+
+    directory = directory or settings.JWT_KEYS_DIR
+    # Keeps the public half so tokens signed with it still verify until they
+    # expire; delete the .pub.pem file afterwards.
+    path = os.path.join(directory, f"{kid}.pem")
+    with open(path, "rb") as file:
+        private_key = serialization.load_pem_private_key(file.read(), password=None)
+    with open(os.path.join(directory, f"{kid}.pub.pem"), "wb") as file:
+        file.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+    os.remove(path)
+    rich.print(f"[green][bold]Signing key {kid} retired![/bold][/green]")
+
+
+# Postgres caps a statement at 32767 bind parameters; a user row takes six.
+IMPORT_MAX_BATCH_SIZE = 5000
+
+
+def _read_import_rows(file, file_format: str):
+    # Yields (row number, raw row); JSONL lines are parsed per row by the
+    # caller so a broken line is rejected instead of aborting the import.
+    if file_format == "csv":
+        yield from enumerate(csv.DictReader(file), start=1)
+    else:
+        for row_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield row_number, line
+
+
+def _validate_import_row(row: Any) -> UserRegister:
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    row.setdefault("confirm_password", row.get("password"))
+    user = UserRegister.model_validate(row)
+    if user.password != user.confirm_password:
+        raise ValueError("Passwords must be the same")
+    return user
+
+
+def _describe_import_error(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+    return str(error)
+
+
+def _write_checkpoint(path: str, row_number: int) -> None:
+    with open(f"{path}.tmp", "w") as file:
+        file.write(str(row_number))
+    os.replace(f"{path}.tmp", path)
+
+
+async def _insert_users(users: list[UserRegister], hashes: list[bytes]) -> int:
+    from db.database import async_session_maker
+    from db.models import User
+    from sqlalchemy.dialects.postgresql import insert
+
+    async with async_session_maker() as session:
+        result = await session.execute(
+            insert(User)
+            .values([
+                {
+                    "username": user.username,
+                    "email": user.email,
+                    "password": hashed_password,
+                    "role": "user",
+                    "is_active": True
+                }
+                for user, hashed_password in zip(users, hashes)
+            ])
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User.email)
+        )
+        inserted = len(result.all())
+        await session.commit()
+    return inserted
+
+
+async def users_import(
+    source: str,
+    file_format: str,
+    batch_size: int,
+    workers: int,
+    checkpoint: str | None,
+    rejects_path: str
+) -> None:
+    from db.database import engine
+    from rich.progress import (
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        TimeElapsedColumn
+    )
+    from security import hash_password
+
+    await apply_migrations()
+
+    resume_after = 0
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as file:
+            resume_after = int(file.read().strip() or 0)
+        rich.print(f"[yellow][bold]Resuming after row {resume_after}[/bold][/yellow]")
+
+    totals = Counter()
+    reasons = Counter()
+    with contextlib.ExitStack() as stack:
+        file = sys.stdin if source == "-" else stack.enter_context(open(source, newline="", encoding="utf-8"))
+        rejects_file = stack.enter_context(open(rejects_path, "a" if resume_after else "w", encoding="utf-8"))
+        executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        progress = stack.enter_context(Progress(
+            SpinnerColumn(),
+            TextColumn("{task.description}"),
+            TextColumn("{task.completed} rows"),
+            TimeElapsedColumn()
+        ))
+        task = progress.add_task("Importing users")
+
+        users: list[UserRegister] = []
+        rejected: list[dict] = []
+        last_row = resume_after
+
+        async def flush() -> None:
+            if users:
+                # Hashing dominates the import, so it is spread over all
+                # workers in chunks rather than one pickled call per row.
+                chunksize = max(1, len(users) // (workers * 4))
+                hashes = await asyncio.to_thread(
+                    list, executor.map(hash_password, [user.password for user in users], chunksize=chunksize)
+                )
+                inserted = await _insert_users(users, hashes)
+                totals["inserted"] += inserted
+                totals["existing"] += len(users) - inserted
+            for reject in rejected:
+                rejects_file.write(json.dumps(reject) + "\n")
+            rejects_file.flush()
+            # Written only after the batch is committed; rows of a batch that
+            # was cut short are retried and skipped by ON CONFLICT on rerun.
+            if checkpoint:
+                _write_checkpoint(checkpoint, last_row)
+            progress.update(task, completed=last_row - resume_after)
+            users.clear()
+            rejected.clear()
+
+        for row_number, row in _read_import_rows(file, file_format):
+            if row_number <= resume_after:
+                continue
+            last_row = row_number
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                users.append(_validate_import_row(row))
+            except ValueError as e:
+                error = _describe_import_error(e)
+                email = row.get("email") if isinstance(row, dict) else None
+                rejected.append({"row": row_number, "email": email, "error": error})
+                totals["rejected"] += 1
+                reasons[error] += 1
+            if len(users) >= batch_size:
+                await flush()
+        await flush()
+
+    await engine.dispose()
+    rich.print(
+        f"[green][bold]Imported {totals['inserted']} users, "
+        f"{totals['existing']} already existed, {totals['rejected']} rejected[/bold][/green]"
+    )
+    if totals["rejected"]:
+        rich.print(f"[yellow][bold]Rejected rows were written to {rejects_path}. Most common reasons:[/bold][/yellow]")
+        for error, count in reasons.most_common(5):
+            rich.print(f"{count:>8}  {error}")
+
+
+@app.command()
+def import_users(
+    source: str = typer.Argument(..., help="CSV or JSONL file with username, email and password, - for stdin"),
+    file_format: str | None = typer.Option(None, "--format", help="csv or jsonl, taken from the file extension by default"),
+    batch_size: int = typer.Option(1000, min=1, max=IMPORT_MAX_BATCH_SIZE, help="Users hashed and inserted together"),
+    workers: int = typer.Option(os.cpu_count() or 1, min=1, help="Processes hashing passwords"),
+    checkpoint: str | None = typer.Option(None, help="File with the last imported row; rerun with the same file to resume"),
+    rejects: str = typer.Option("rejects.jsonl", help="JSONL file for rows that failed validation"),
+) -> None:
+    if file_format is None:
+        file_format = "csv" if source.lower().endswith(".csv") else "jsonl"
+    if file_format not in ("csv", "jsonl"):
+        rich.print(f"[red][bold]Unknown format {file_format}! Choose csv or jsonl[/bold][/red]")
+        raise typer.Exit(code=1)
+    asyncio.run(users_import(source, file_format, batch_size, workers, checkpoint, rejects))
+
+
+async def users_export(
+    output: str,
+    file_format: str,
+    compress: bool,
+    is_active: bool | None,
+    roles: str | None
+) -> None:
+    from db.database import (
+        engine,
+        open_read_session,
+        replica_engines
+    )
+    from db.export import (
+        stream_export,
+        user_export_query
+    )
+
+    exported_bytes = 0
+    with contextlib.ExitStack() as stack:
+        file = sys.stdout.buffer if output == "-" else stack.enter_context(open(output, "wb"))
+        # Reads from a reachable replica when one is configured to keep the
+        # scan off the primary, and from the primary otherwise.
+        async with await open_read_session() as session:
+            async for chunk in stream_export(session, user_export_query(is_active, roles), file_format, compress):
+                file.write(chunk)
+                exported_bytes += len(chunk)
+        file.flush()
+    await engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+    if output != "-":
+        rich.print(f"[green][bold]Exported users to {output} ({exported_bytes} bytes)[/bold][/green]")
+
+
+@app.command()
+def export_users(
+    output: str = typer.Argument(..., help="File to write, - for stdout"),
+    file_format: str | None = typer.Option(None, "--format", help="csv or ndjson, taken from the file extension by default"),
+    compress: bool | None = typer.Option(None, "--gzip/--no-gzip", help="Compress with gzip, on by default for .gz files"),
+    is_active: bool | None = typer.Option(None, "--is-active/--is-inactive", help="Only active or only inactive users"),
+    roles: str | None = typer.Option(None, help="Select the desired roles: admin, superadmin, user. Example: admin,user"),
+) -> None:
+    from db.export import EXPORT_FORMATS
+
+    name = output.lower().removesuffix(".gz")
+    if compress is None:
+        compress = output.lower().endswith(".gz")
+    if file_format is None:
+        file_format = "csv" if name.endswith(".csv") else "ndjson"
+    if file_format not in EXPORT_FORMATS:
+        rich.print(f"[red][bold]Unknown format {file_format}! Choose one of: {', '.join(EXPORT_FORMATS)}[/bold][/red]")
+        raise typer.Exit(code=1)
+    asyncio.run(users_export(output, file_format, compress, is_active, roles))
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("0.0.0.0", help="Address to bind"),
+    port: int = typer.Option(8000, help="Port to bind"),
+    workers: int | None = typer.Option(None, min=1, help="Worker processes. Defaults to the CPUs this process may use"),
+    graceful_timeout: float = typer.Option(30.0, help="Seconds to let in-flight requests finish on shutdown"),
+    keep_alive: int = typer.Option(5, help="Seconds to keep idle connections open"),
+    limit_concurrency: int | None = typer.Option(None, help="Requests per worker before answering 503"),
+    access_log: bool = typer.Option(False, help="Log every request"),
+) -> None:
+    import uvicorn
+    from config import settings
+
+    # The in-memory item store lives in one process: with several workers,
+    # ids collide, items are only visible on the worker that created them
+    # and every worker overwrites the same snapshot on shutdown.
+    if settings.ITEMS_BACKEND == "memory":
+        if workers is not None and workers > 1:
+            rich.print("[red][bold]ITEMS_BACKEND=memory supports a single worker only[/bold][/red]")
+            raise typer.Exit(code=1)
+        workers = 1
+    # process_cpu_count respects CPU affinity, e.g. taskset or cpusets.
+    workers = workers or os.process_cpu_count() or 1
+    if workers > 1 and settings.LOGIN_RATE_LIMIT_BACKEND == "memory":
+        rich.print(
+            f"[yellow][bold]LOGIN_RATE_LIMIT_BACKEND=memory counts attempts per worker, "
+            f"so clients get up to {workers}x the login limit; use redis to share it[/bold][/yellow]"
+        )
+    # Both ship with uvicorn[standard]; uvloop is not available on Windows.
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    rich.print(f"[green][bold]Serving on {host}:{port} with {workers} workers ({loop}, {http})[/bold][/green]")
+    # Each worker is a fresh process that imports main and opens its own
+    # pools in lifespan; on SIGTERM it stops accepting, waits up to
+    # graceful_timeout for open requests and then runs the lifespan shutdown.
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=graceful_timeout,
+        timeout_keep_alive=keep_alive,
+        limit_concurrency=limit_concurrency,
+        access_log=access_log,
+        proxy_headers=True
+    )
+
+
+def _parse_import_times(output: str, module: str) -> tuple[float, list[tuple[str, float]]]:
+    # -X importtime prints "import time: self [us] | cumulative | package",
+    # two spaces of indent per nesting level, children before their parent.
+    total_us = 0.0
+    children: list[tuple[str, float]] = []
+    direct_imports: list[tuple[str, float]] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif level == 0:
+            if name.strip() == module:
+                total_us = int(cumulative)
+                direct_imports = children
+            children = []
+    return total_us / 1000, direct_imports
+
+
+@app.command()
+def import_time(
+    module: str = typer.Argument("main", help="Module to import in a fresh interpreter, e.g. main or cli"),
+    budget_ms: float = typer.Option(1500.0, help="Exit with an error when importing takes longer"),
+    top: int = typer.Option(15, min=1, help="Slowest direct imports to list"),
+) -> None:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        rich.print(f"[red][bold]Importing {module} failed:[/bold][/red]\n{result.stderr[-2000:]}")
+        raise typer.Exit(code=1)
+    
+    total_ms, direct_imports = _parse_import_times(result.stderr, module)
+    for name, elapsed_ms in sorted(direct_imports, key=lambda item: item[1], reverse=True)[:top]:
+        rich.print(f"{elapsed_ms:>10.1f} ms  {name}")
+    if total_ms > budget_ms:
+        rich.print(f"[red][bold]Importing {module} took {total_ms:.1f} ms, over the {budget_ms:.0f} ms budget[/bold][/red]")
+        raise typer.Exit(code=1)
+    rich.print(f"[green][bold]Importing {module} took {total_ms:.1f} ms, within the {budget_ms:.0f} ms budget[/bold][/green]")
+
+
 if __name__ == "__main__":
     app()
 
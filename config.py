@@ -2,12 +2,67 @@ from pydantic_settings import (
     BaseSettings, 
     SettingsConfigDict
 )
+from typing import Literal
 
 
 class Settings(BaseSettings):
     DB_URL: str 
     JWT_SECRET_KEY: str 
     JWT_ALGORITHM: str 
+    # Used when JWT_ALGORITHM is asymmetric (EdDSA, RS256, ES256, ...).
+    JWT_KEYS_DIR: str = "keys"
+    JWT_ACTIVE_KID: str | None = None
+    DB_MIGRATE_ON_STARTUP: bool = True
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_WARMUP_CONNECTIONS: int = 2
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_REPLICA_URLS: list[str] = []
+    # After a commit the client reads from the primary for this long, so it
+    # sees its own writes despite replica lag.
+    DB_REPLICA_STICKY_SECONDS: float = 5.0
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    DB_REPLICA_CONNECT_TIMEOUT: float = 2.0
+
+    PASSWORD_HASHER: Literal["bcrypt", "scrypt"] = "bcrypt"
+    # None uses the hasher's default; pick one with "cli.py calibrate-hasher".
+    PASSWORD_HASH_COST: int | None = None
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_MAX_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    LOGIN_RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    LOGIN_RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = 20
+    LOGIN_MAX_ATTEMPTS_PER_EMAIL: int = 5
+    LOGIN_ATTEMPT_WINDOW_SECONDS: float = 60.0
+    LOGIN_BACKOFF_BASE_SECONDS: float = 30.0
+    LOGIN_BACKOFF_MAX_SECONDS: float = 900.0
+
+    USER_CACHE_MAX_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 5.0
+    TOKEN_CACHE_MAX_SIZE: int = 50_000
+    TOKEN_VERSION_CACHE_MAX_SIZE: int = 100_000
+    TOKEN_VERSION_CACHE_TTL_SECONDS: float = 30.0
+    TOKEN_REVOCATION_BLOOM_CAPACITY: int = 100_000
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    # Revocations from other workers are seen after at most this long.
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = 30.0
+
+    # "memory" keeps items in process for deployments without a database.
+    ITEMS_BACKEND: Literal["database", "memory"] = "database"
+    ITEMS_SNAPSHOT_PATH: str | None = None
+
+    # Serves /metrics without authentication; keep it off the public
+    # listener or disable it.
+    METRICS_ENABLED: bool = True
+    # Share of ordinary requests profiled into the admin profile buffer;
+    # admins can profile a single request with the X-Profile header.
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_BUFFER_SIZE: int = 50
     
     model_config = SettingsConfigDict(
         env_file=".env"
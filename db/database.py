@@ -1,15 +1,127 @@
+import itertools
+import os
+import time
+
 from collections.abc import AsyncGenerator
 from config import settings
+from db.pool import (
+    InstrumentedAsyncAdaptedQueuePool,
+    instrument_engine
+)
+from fastapi import (
+    Request,
+    Response
+)
+from sqlalchemy import (
+    event,
+    make_url
+)
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
     async_sessionmaker, 
     create_async_engine
 )
+from sqlalchemy.orm import Session
+
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+
+
 
-engine = create_async_engine(url=settings.DB_URL, echo=False)
+def _create_engine(url: str, name: str, **connect_args) -> AsyncEngine:
+    if make_url(url).drivername == "postgresql+asyncpg":
+        connect_args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+    new_engine = create_async_engine(
+        url=url,
+        echo=False,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+    instrument_engine(new_engine, name)
+    return new_engine
+
+
+engine = _create_engine(settings.DB_URL, "primary")
+replica_engines = [
+    _create_engine(url, f"replica-{index}", timeout=settings.DB_REPLICA_CONNECT_TIMEOUT)
+    for index, url in enumerate(settings.DB_REPLICA_URLS)
+]
 
 async_session_maker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+replica_session_makers = [
+    async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+    for replica_engine in replica_engines
+]
+
+def _dispose_pools_after_fork() -> None:
+    # A forked child (pre-forking servers, the process hashing pool) must not
+    # reuse the parent's sockets. close=False drops the inherited
+    # connections without closing them, which would also close them for
+    # the parent, and gives the child fresh pools.
+    for pool_engine in (engine, *replica_engines):
+        pool_engine.sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_pools_after_fork)
+
+_replica_counter = itertools.count()
+_replica_down_until = [0.0] * len(replica_engines)
 
-async def get_session() -> AsyncGenerator:
+
+@event.listens_for(Session, "after_commit")
+def _stick_to_primary(session: Session) -> None:
+    response = session.info.get("response")
+    if response is None or not replica_engines:
+        return
+    response.set_cookie(
+        key=PRIMARY_STICKY_COOKIE,
+        value=str(time.time() + settings.DB_REPLICA_STICKY_SECONDS),
+        max_age=max(1, int(settings.DB_REPLICA_STICKY_SECONDS)),
+        secure=True,
+        httponly=True
+    )
+
+
+async def get_session(response: Response) -> AsyncGenerator:
     async with async_session_maker() as session:
+        session.info["response"] = response
+        yield session
+
+
+def _reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def mark_replica_down(index: int) -> None:
+    _replica_down_until[index] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+
+
+async def open_read_session(request: Request | None = None) -> AsyncSession:
+    if replica_session_makers and (request is None or not _reads_from_primary(request)):
+        for _ in range(len(replica_session_makers)):
+            index = next(_replica_counter) % len(replica_session_makers)
+            if _replica_down_until[index] > time.monotonic():
+                continue
+            session = replica_session_makers[index]()
+            try:
+                await session.connection()
+                return session
+            except (OSError, TimeoutError, SQLAlchemyError):
+                await session.close()
+                mark_replica_down(index)
+    return async_session_maker()
+
+
+async def get_read_session(request: Request) -> AsyncGenerator:
+    session = await open_read_session(request)
+    async with session:
         yield session
-        
\ No newline at end of file
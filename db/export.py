@@ -0,0 +1,52 @@
+import csv
+import io
+import orjson
+import zlib
+
+from collections.abc import AsyncIterator
+from db.models import User
+from db.queries import apply_user_filters
+from sqlalchemy import (
+    Select,
+    select
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_BATCH_SIZE = 1000
+USER_EXPORT_COLUMNS = (User.id, User.username, User.email, User.role, User.is_active)
+
+
+def user_export_query(is_active: bool | None, roles: str | None) -> Select:
+    return apply_user_filters(select(*USER_EXPORT_COLUMNS), is_active, roles).order_by(User.id)
+
+
+def _encode_rows(rows, file_format: str) -> bytes:
+    if file_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+async def stream_export(
+    session: AsyncSession,
+    query: Select,
+    file_format: str,
+    compress: bool = False
+) -> AsyncIterator[bytes]:
+    # yield_per keeps a server-side cursor open and holds only one batch of
+    # rows in memory, however large the table is.
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def encode(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if file_format == "csv":
+        yield encode(_encode_rows([[column.key for column in query.selected_columns]], file_format))
+    result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        yield encode(_encode_rows(rows, file_format))
+    if compressor:
+        yield compressor.flush()
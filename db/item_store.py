@@ -0,0 +1,177 @@
+import mmap
+import os
+import struct
+import threading
+
+from typing import Any
+from config import settings
+from db.models import Item as ItemModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Column order matches schemas.items.Item, so the dicts serialize exactly
+# like the validated model.
+ITEM_COLUMNS = (ItemModel.name, ItemModel.description, ItemModel.id, ItemModel.owner_id)
+
+
+class DatabaseItemStore:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    # Plain rows for read-only listings: no ORM objects, identity map or
+    # pydantic validation on the way to the JSON encoder.
+    async def list_all_dicts(self) -> list[dict[str, Any]]:
+        result = await self.session.execute(select(*ITEM_COLUMNS).order_by(ItemModel.id))
+        return [dict(row) for row in result.mappings()]
+
+    async def list_dicts_by_owner(self, owner_id: int) -> list[dict[str, Any]]:
+        result = await self.session.execute(
+            select(*ITEM_COLUMNS)
+            .where(ItemModel.owner_id == owner_id)
+            .order_by(ItemModel.id)
+        )
+        return [dict(row) for row in result.mappings()]
+
+    async def get(self, item_id: int) -> ItemModel | None:
+        return await self.session.get(ItemModel, item_id)
+
+    async def add(self, name: str, description: str, owner_id: int) -> ItemModel:
+        item = ItemModel(name=name, description=description, owner_id=owner_id)
+        self.session.add(item)
+        await self.session.commit()
+        return item
+
+    async def update(self, item: ItemModel, name: str | None, description: str | None) -> ItemModel:
+        if name:
+            item.name = name
+        if description:
+            item.description = description
+        await self.session.commit()
+        return item
+
+    async def delete(self, item: ItemModel) -> None:
+        await self.session.delete(item)
+        await self.session.commit()
+
+
+class ItemRecord:
+    __slots__ = ("id", "name", "description", "owner_id")
+
+    def __init__(self, id: int, name: str, description: str, owner_id: int) -> None:
+        self.id = id
+        self.name = name
+        self.description = description
+        self.owner_id = owner_id
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"name": self.name, "description": self.description, "id": self.id, "owner_id": self.owner_id}
+
+
+# Snapshot layout: header (magic, next id, record count), then per record
+# (id, owner_id, len(name), len(description)) followed by the UTF-8 bytes.
+SNAPSHOT_MAGIC = b"ITEMSNP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQQ")
+SNAPSHOT_RECORD = struct.Struct("<QQII")
+
+
+class MemoryItemStore:
+    def __init__(self, snapshot_path: str | None = None) -> None:
+        self.snapshot_path = snapshot_path
+        self._items: dict[int, ItemRecord] = {}
+        self._by_owner: dict[int, dict[int, ItemRecord]] = {}
+        # Ids are never reused, even after deletes.
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def list_all_dicts(self) -> list[dict[str, Any]]:
+        # Ids are allocated in increasing order, so insertion order is id order.
+        with self._lock:
+            return [item.as_dict() for item in self._items.values()]
+
+    async def list_dicts_by_owner(self, owner_id: int) -> list[dict[str, Any]]:
+        with self._lock:
+            return [item.as_dict() for item in self._by_owner.get(owner_id, {}).values()]
+
+    async def get(self, item_id: int) -> ItemRecord | None:
+        return self._items.get(item_id)
+
+    async def add(self, name: str, description: str, owner_id: int) -> ItemRecord:
+        with self._lock:
+            item = ItemRecord(self._next_id, name, description, owner_id)
+            self._next_id += 1
+            self._insert(item)
+        return item
+
+    async def update(self, item: ItemRecord, name: str | None, description: str | None) -> ItemRecord:
+        with self._lock:
+            if name:
+                item.name = name
+            if description:
+                item.description = description
+        return item
+
+    async def delete(self, item: ItemRecord) -> None:
+        with self._lock:
+            self._items.pop(item.id, None)
+            owner_items = self._by_owner.get(item.owner_id)
+            if owner_items is not None:
+                owner_items.pop(item.id, None)
+                if not owner_items:
+                    del self._by_owner[item.owner_id]
+
+    def _insert(self, item: ItemRecord) -> None:
+        self._items[item.id] = item
+        self._by_owner.setdefault(item.owner_id, {})[item.id] = item
+
+    def save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            next_id = self._next_id
+            records = [
+                (item.id, item.owner_id, item.name.encode(), item.description.encode())
+                for item in self._items.values()
+            ]
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, next_id, len(records)))
+            for item_id, owner_id, name, description in records:
+                file.write(SNAPSHOT_RECORD.pack(item_id, owner_id, len(name), len(description)))
+                file.write(name)
+                file.write(description)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load_snapshot(self) -> None:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        if os.path.getsize(self.snapshot_path) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"Item snapshot {self.snapshot_path} is truncated")
+        with open(self.snapshot_path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, next_id, count = SNAPSHOT_HEADER.unpack_from(buffer, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.snapshot_path} is not an item snapshot")
+            view = memoryview(buffer)
+            try:
+                offset = SNAPSHOT_HEADER.size
+                with self._lock:
+                    self._items.clear()
+                    self._by_owner.clear()
+                    for _ in range(count):
+                        item_id, owner_id, name_len, description_len = SNAPSHOT_RECORD.unpack_from(buffer, offset)
+                        offset += SNAPSHOT_RECORD.size
+                        name = str(view[offset:offset + name_len], "utf-8")
+                        offset += name_len
+                        description = str(view[offset:offset + description_len], "utf-8")
+                        offset += description_len
+                        self._insert(ItemRecord(item_id, name, description, owner_id))
+                    self._next_id = next_id
+            finally:
+                view.release()
+
+
+memory_item_store = MemoryItemStore(snapshot_path=settings.ITEMS_SNAPSHOT_PATH)
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import re
+
+from dataclasses import dataclass
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine
+)
+
+
+# Arbitrary key for pg_advisory_lock so that several workers booting at once
+# apply migrations one at a time.
+MIGRATIONS_LOCK_ID = 7_302_441_152
+MIGRATIONS_LOCK_POLL_SECONDS = 0.05
+MIGRATIONS_LOCK_MAX_POLL_SECONDS = 1.0
+CONCURRENT_INDEX_PATTERN = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    # Non-transactional migrations run in autocommit mode, which is what
+    # CREATE/DROP INDEX CONCURRENTLY requires. A failed concurrent build leaves
+    # an INVALID index behind; run_migrations drops and rebuilds it.
+    transactional: bool = True
+
+    @property
+    def concurrent_indexes(self) -> list[str]:
+        return [match[1] for statement in self.statements if (match := CONCURRENT_INDEX_PATTERN.search(statement))]
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        version=1,
+        name="create users table",
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                username VARCHAR NOT NULL,
+                email VARCHAR NOT NULL,
+                role VARCHAR NOT NULL,
+                password BYTEA NOT NULL,
+                is_active BOOLEAN NOT NULL
+            )
+            """,
+        ),
+    ),
+    Migration(
+        version=2,
+        name="index users email, role, is_active and username",
+        statements=(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email ON users (email)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_role_is_active ON users (role, is_active, id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_is_active ON users (is_active, id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username ON users (username, id)",
+            # Left over from create_all; the primary key already covers it.
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_users_id",
+        ),
+        transactional=False,
+    ),
+    Migration(
+        version=3,
+        name="create items table",
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                description VARCHAR NOT NULL,
+                owner_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_items_owner_id ON items (owner_id)",
+        ),
+    ),
+    Migration(
+        version=4,
+        name="add users token_version",
+        statements=(
+            # A constant default is a catalog-only change, no table rewrite.
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+        ),
+    ),
+    Migration(
+        version=5,
+        name="create revoked_tokens table",
+        statements=(
+            """
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti VARCHAR PRIMARY KEY,
+                expires_at TIMESTAMPTZ NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at)",
+        ),
+    ),
+    Migration(
+        version=6,
+        name="index users username and email for search",
+        statements=(
+            # Needs a role allowed to create extensions on the first run.
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            # C collation orders by code point, so one btree serves both the
+            # prefix range and ORDER BY, like text_pattern_ops does for LIKE.
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_prefix ON users (lower(username) COLLATE "C")',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_prefix ON users (lower(email) COLLATE "C")',
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)",
+        ),
+        transactional=False,
+    ),
+    Migration(
+        version=7,
+        name="replace users trigram GIN indexes with GiST",
+        statements=(
+            # GiST can return rows ordered by trigram distance (<->), so a
+            # ranked, LIMITed substring search stops early; GIN cannot.
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_trgm_gist ON users USING gist (lower(username) gist_trgm_ops)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_trgm_gist ON users USING gist (lower(email) gist_trgm_ops)",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_users_username_trgm",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_trgm",
+        ),
+        transactional=False,
+    ),
+)
+
+
+def _fingerprint(migrations: tuple[Migration, ...]) -> str:
+    digest = hashlib.sha256()
+    for migration in migrations:
+        digest.update(repr((migration.version, migration.name, migration.statements, migration.transactional)).encode())
+    return digest.hexdigest()
+
+
+# Stored once every migration in this build is applied. A boot that finds
+# it needs a single SELECT instead of the lock, the DDL and the version
+# check. All fingerprints are kept, so workers of two builds running side by
+# side during a deploy both stay on the fast path.
+SCHEMA_FINGERPRINT = _fingerprint(MIGRATIONS)
+CONCURRENT_INDEXES = [name for migration in MIGRATIONS for name in migration.concurrent_indexes]
+
+
+async def schema_is_current(engine: AsyncEngine) -> bool:
+    async with engine.connect() as conn:
+        # Autocommit so that the error on a fresh database, where the table
+        # does not exist yet, leaves no aborted transaction behind.
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            # An INVALID concurrent index sends the boot down the slow path,
+            # which rebuilds it.
+            result = await conn.execute(
+                text(
+                    """
+                    SELECT 1 FROM schema_fingerprints WHERE fingerprint = :fingerprint
+                    AND NOT EXISTS (
+                        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE NOT i.indisvalid AND c.relname = ANY(:indexes) AND pg_table_is_visible(c.oid)
+                    )
+                    """
+                ),
+                {"fingerprint": SCHEMA_FINGERPRINT, "indexes": CONCURRENT_INDEXES}
+            )
+        except DBAPIError:
+            return False
+        return result.first() is not None
+
+
+async def _acquire_migrations_lock(conn: AsyncConnection) -> None:
+    # Poll instead of blocking in pg_advisory_lock: a backend waiting in that
+    # statement holds a snapshot, and CREATE INDEX CONCURRENTLY in the lock
+    # holder waits for every older snapshot, so the two would deadlock.
+    delay = MIGRATIONS_LOCK_POLL_SECONDS
+    while True:
+        result = await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        if result.scalar():
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MIGRATIONS_LOCK_MAX_POLL_SECONDS)
+
+
+async def _invalid_indexes(conn: AsyncConnection, names: list[str]) -> list[str]:
+    if not names:
+        return []
+    result = await conn.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(:names) AND pg_table_is_visible(c.oid)
+            """
+        ),
+        {"names": names}
+    )
+    return list(result.scalars().all())
+
+
+async def _build_concurrently(conn: AsyncConnection, migration: Migration) -> None:
+    invalid = set(await _invalid_indexes(conn, migration.concurrent_indexes))
+    for statement in migration.statements:
+        match = CONCURRENT_INDEX_PATTERN.search(statement)
+        if match and match[1] in invalid:
+            # IF NOT EXISTS would skip the INVALID index a failed build left.
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {match[1]}"))
+        await conn.execute(text(statement))
+    invalid = await _invalid_indexes(conn, migration.concurrent_indexes)
+    if invalid:
+        raise RuntimeError(f"Migration {migration.version} left invalid indexes: {', '.join(invalid)}")
+
+
+async def run_migrations(engine: AsyncEngine, force: bool = False) -> list[Migration]:
+    if not force and await schema_is_current(engine):
+        return []
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await _acquire_migrations_lock(lock_conn)
+        try:
+            await lock_conn.execute(text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            ))
+            result = await lock_conn.execute(text("SELECT version FROM schema_migrations"))
+            applied = set(result.scalars().all())
+            pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+
+            # Applied migrations whose concurrent build was later left invalid,
+            # e.g. recorded by a release that did not check, are rebuilt too.
+            for migration in MIGRATIONS:
+                if migration.version in applied and await _invalid_indexes(lock_conn, migration.concurrent_indexes):
+                    await _build_concurrently(lock_conn, migration)
+
+            for migration in pending:
+                record_stmt = text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)")
+                record_params = {"version": migration.version, "name": migration.name}
+                if migration.transactional:
+                    async with engine.begin() as conn:
+                        for statement in migration.statements:
+                            await conn.execute(text(statement))
+                        await conn.execute(record_stmt, record_params)
+                else:
+                    await _build_concurrently(lock_conn, migration)
+                    await lock_conn.execute(record_stmt, record_params)
+
+            await lock_conn.execute(text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_fingerprints (
+                    fingerprint VARCHAR(64) PRIMARY KEY,
+                    recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            ))
+            await lock_conn.execute(
+                text("INSERT INTO schema_fingerprints (fingerprint) VALUES (:fingerprint) ON CONFLICT DO NOTHING"),
+                {"fingerprint": SCHEMA_FINGERPRINT}
+            )
+            return pending
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATIONS_LOCK_ID})
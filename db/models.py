@@ -1,9 +1,15 @@
+import datetime
+
 from pydantic import EmailStr
 from sqlalchemy import (
     Boolean, 
+    DateTime,
+    ForeignKey,
+    Index,
     Integer,
     LargeBinary,
-    String
+    String,
+    text
 )
 from sqlalchemy.orm import (
     DeclarativeBase, 
@@ -16,12 +22,40 @@ class Base(DeclarativeBase):
     pass
 
 
+# The schema itself is created by db/migrations.py; keep these definitions in
+# sync with it.
 class User(Base):
     __tablename__ = 'users'
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, index=True)
+    __table_args__ = (
+        Index("ix_users_role_is_active", "role", "is_active", "id"),
+        Index("ix_users_is_active", "is_active", "id"),
+        Index("ix_users_username", "username", "id"),
+        # Search indexes, see db/queries.py.
+        Index("ix_users_username_prefix", text('lower(username) COLLATE "C"')),
+        Index("ix_users_email_prefix", text('lower(email) COLLATE "C"')),
+        Index("ix_users_username_trgm_gist", text("lower(username) gist_trgm_ops"), postgresql_using="gist"),
+        Index("ix_users_email_trgm_gist", text("lower(email) gist_trgm_ops"), postgresql_using="gist"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String)
-    email: Mapped[EmailStr] = mapped_column(String)
+    email: Mapped[EmailStr] = mapped_column(String, unique=True, index=True)
     role: Mapped[str] = mapped_column(String, default="user")
     password: Mapped[bytes] = mapped_column(LargeBinary)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
-    
\ No newline at end of file
+    # Bumped whenever the role or status changes; tokens carrying an older
+    # version are rejected.
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+
+class Item(Base):
+    __tablename__ = 'items'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String)
+    description: Mapped[str] = mapped_column(String)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+
+
+class RevokedToken(Base):
+    __tablename__ = 'revoked_tokens'
+    jti: Mapped[str] = mapped_column(String, primary_key=True)
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+from metrics import (
+    CounterFamily,
+    GaugeFamily,
+    Histogram,
+    HistogramFamily,
+    registry
+)
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Any
+
+
+class PoolMetrics:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wait_seconds = Histogram()
+        self.overflow_events = 0
+        self.timeouts = 0
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        if self.metrics is None:
+            return super()._do_get()
+        overflow_before = self._overflow
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait_seconds.observe(time.perf_counter() - start)
+        # _overflow counts up from -pool_size; above zero every new
+        # connection is an overflow connection.
+        if self._overflow > max(overflow_before, 0):
+            self.metrics.overflow_events += 1
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+query_seconds = registry.histogram(
+    "db_query_seconds",
+    "Time of every statement sent to the database, by database and statement type",
+    ("database", "statement")
+)
+instrumented_engines: list[AsyncEngine] = []
+
+
+def _statement_type(statement: str) -> str:
+    words = statement.split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedAsyncAdaptedQueuePool):
+        pool.metrics = PoolMetrics(name)
+    instrumented_engines.append(engine)
+
+    # The cursor events run around the awaited driver call, so the time is
+    # the round trip to the database without pool checkout or ORM work.
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        query_seconds.labels(name, _statement_type(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _drop_query_timer(exception_context):
+        starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+
+def _collect_pool_metrics():
+    wait_seconds = HistogramFamily("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ("pool",))
+    overflow_events = CounterFamily("db_pool_overflow_events_total", "Connections opened beyond pool_size", ("pool",))
+    timeouts = CounterFamily("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout", ("pool",))
+    checked_out = GaugeFamily("db_pool_checked_out", "Connections currently checked out", ("pool",))
+    for engine in instrumented_engines:
+        pool = engine.sync_engine.pool
+        if not isinstance(pool, InstrumentedAsyncAdaptedQueuePool) or pool.metrics is None:
+            continue
+        wait_seconds.children[(pool.metrics.name,)] = pool.metrics.wait_seconds
+        overflow_events.inc(pool.metrics.name, amount=pool.metrics.overflow_events)
+        timeouts.inc(pool.metrics.name, amount=pool.metrics.timeouts)
+        checked_out.set(pool.metrics.name, value=pool.checkedout())
+    return (wait_seconds, overflow_events, timeouts, checked_out)
+
+
+registry.add_collector(_collect_pool_metrics)
+
+
+def pool_stats(engine: AsyncEngine) -> dict[str, Any]:
+    pool = engine.sync_engine.pool
+    stats: dict[str, Any] = {"status": pool.status()}
+    if isinstance(pool, InstrumentedAsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+        if pool.metrics is not None:
+            stats.update({
+                "overflow_events": pool.metrics.overflow_events,
+                "timeouts": pool.metrics.timeouts,
+                "wait_seconds": pool.metrics.wait_seconds.snapshot(),
+            })
+    return stats
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int) -> None:
+    # Open the connections at the same time so the pool really holds that
+    # many; opening them one by one would reuse the first.
+    pending = [engine.connect() for _ in range(connections)]
+    results = await asyncio.gather(*(conn.start() for conn in pending), return_exceptions=True)
+    await asyncio.gather(*(conn.close() for conn, result in zip(pending, results)
+                           if not isinstance(result, BaseException)))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
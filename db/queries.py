@@ -0,0 +1,159 @@
+import base64
+import json
+
+from db.models import User
+from sqlalchemy import (
+    Select,
+    ColumnElement,
+    Float,
+    and_,
+    asc,
+    desc,
+    func,
+    literal,
+    or_
+)
+from sqlalchemy.orm import InstrumentedAttribute
+from typing import Any
+
+
+USER_SORT_FIELDS = ("id", "username", "email", "role", "is_active")
+USER_SEARCH_FIELDS = ("username", "email")
+# Trigram indexes can only narrow LIKE '%term%' down once the term holds a
+# whole trigram; shorter terms are matched by prefix alone.
+MIN_SUBSTRING_SEARCH_LENGTH = 3
+MAX_ID_RANGE_PARTS = 1000
+
+UserOrder = list[tuple[InstrumentedAttribute, bool]]
+
+
+def apply_user_filters(query: Select, is_active: bool | None, roles: str | None) -> Select:
+    if is_active is True or is_active is False:
+        query = query.where(User.is_active == is_active)
+    if roles:
+        query = query.where(User.role.in_(roles.split(",")))
+    return query
+
+
+# "id:desc,username:ASC" -> [(User.id, True), (User.username, False)].
+# Unknown fields are ignored; id is always appended as a tie-breaker so the
+# order is total and can be resumed from a cursor.
+def parse_user_sort(sort_by: str | None) -> UserOrder:
+    order: UserOrder = []
+    if sort_by:
+        for field in sort_by.split(","):
+            field_name, sort_order = field.split(":")
+            field_name = field_name.strip().lower()
+            if field_name in USER_SORT_FIELDS:
+                order.append((getattr(User, field_name), sort_order.strip().lower() == "desc"))
+    if not any(column.key == "id" for column, _ in order):
+        order.append((User.id, False))
+    return order
+
+
+def apply_user_order(query: Select, order: UserOrder) -> Select:
+    return query.order_by(*(desc(column) if descending else asc(column) for column, descending in order))
+
+
+def _order_signature(order: UserOrder) -> list[str]:
+    return [f"{column.key}:{'desc' if descending else 'asc'}" for column, descending in order]
+
+
+def encode_cursor(order: UserOrder, row: Any) -> str:
+    data = {
+        "o": _order_signature(order),
+        "v": [getattr(row, column.key) for column, _ in order]
+    }
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(order: UserOrder, cursor: str) -> list[Any]:
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(data, dict) or not isinstance(data.get("v"), list):
+        raise ValueError("Malformed cursor")
+    if data.get("o") != _order_signature(order) or len(data["v"]) != len(order):
+        raise ValueError("Cursor does not match the requested sorting")
+    for (column, _), value in zip(order, data["v"]):
+        # bool is an int subclass, so compare the exact type.
+        if type(value) is not column.type.python_type:
+            raise ValueError("Cursor values do not match the sort columns")
+    return data["v"]
+
+
+def apply_keyset(query: Select, order: UserOrder, values: list[Any]) -> Select:
+    # (a, b, c) > (va, vb, vc) spelled out per column, because the sort
+    # direction may differ between columns.
+    # Bound as typed literals: SQLAlchemy refuses "<"/">" against bare booleans.
+    bounds = [literal(value, type_=column.type) for (column, _), value in zip(order, values)]
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal_prefix = [order[j][0] == bounds[j] for j in range(i)]
+        after = column < bounds[i] if descending else column > bounds[i]
+        clauses.append(and_(*equal_prefix, after))
+    return query.where(or_(*clauses))
+
+
+# "1,2,5-10" -> [(1, 1), (2, 2), (5, 10)]. Ranges stay as bounds and are never
+# expanded, so "1-50000000" costs the same as "1-2".
+def parse_id_ranges(ids: str) -> list[tuple[int, int]]:
+    parts = ids.split(",")
+    if len(parts) > MAX_ID_RANGE_PARTS:
+        raise ValueError(f"At most {MAX_ID_RANGE_PARTS} ids or ranges are allowed")
+    ranges = []
+    for part in parts:
+        bounds = part.split("-")
+        if len(bounds) == 1:
+            start = end = int(bounds[0])
+        elif len(bounds) == 2:
+            start, end = int(bounds[0]), int(bounds[1])
+        else:
+            raise ValueError(f"Invalid id range {part!r}")
+        if start > end:
+            raise ValueError(f"Invalid id range {part!r}")
+        ranges.append((start, end))
+    return ranges
+
+
+def id_ranges_predicate(column: InstrumentedAttribute, ranges: list[tuple[int, int]]) -> ColumnElement[bool]:
+    single_ids = [start for start, end in ranges if start == end]
+    clauses = [column.between(start, end) for start, end in ranges if start != end]
+    if single_ids:
+        clauses.append(column.in_(single_ids))
+    return or_(*clauses)
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    return value.replace(escape, escape * 2).replace("%", f"{escape}%").replace("_", f"{escape}_")
+
+
+# Both searches take a lowercased term and add the field name and a score to
+# the selected columns, so results of several fields can be merged.
+def user_prefix_search(query: Select, field: str, term: str, limit: int) -> Select:
+    # A range on the C-collated expression rather than LIKE 'term%': it walks
+    # ix_users_<field>_prefix in order, also under generic prepared plans,
+    # where the planner cannot turn a bound LIKE pattern into a range.
+    key = func.lower(getattr(User, field)).collate("C")
+    upper_bound = term[:-1] + chr(ord(term[-1]) + 1)
+    return (
+        query
+        .add_columns(literal(field).label("matched_field"), literal(1.0).label("score"))
+        .where(key >= term, key < upper_bound)
+        .order_by(key)
+        .limit(limit)
+    )
+
+
+def user_substring_search(query: Select, field: str, term: str, limit: int) -> Select:
+    # A KNN scan of the ix_users_<field>_trgm_gist index returns rows nearest
+    # first, so the LIMIT stops it early; ordering by similarity() would score
+    # and sort every match. Distance is 1 - similarity, with no tie-breaker
+    # so that the index order is used as is.
+    key = func.lower(getattr(User, field))
+    distance = key.op("<->", return_type=Float)(term)
+    return (
+        query
+        .add_columns(literal(field).label("matched_field"), (1 - distance).label("score"))
+        .where(key.like(f"%{escape_like(term)}%", escape="\\"))
+        .order_by(distance)
+        .limit(limit)
+    )
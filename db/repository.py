@@ -0,0 +1,73 @@
+import time
+
+from db.models import User
+from metrics import (
+    Histogram,
+    HistogramFamily,
+    registry
+)
+from sqlalchemy import (
+    bindparam,
+    select
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Built once at import time: SQLAlchemy memoizes the cache key of these
+# constructs, so every call is a compiled-cache hit, and the SQL text is
+# identical each time, so asyncpg reuses the statement it already prepared
+# on the connection.
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+USER_ID_BY_EMAIL = select(User.id).where(User.email == bindparam("email"))
+USER_AUTH_STATE_BY_ID = (
+    select(User.token_version, User.is_active)
+    .where(User.id == bindparam("user_id"))
+)
+
+statement_timings: dict[str, Histogram] = {}
+
+
+def _collect_statement_metrics():
+    family = HistogramFamily(
+        "db_statement_seconds",
+        "Execution time of the named user lookup statements, including pool checkout",
+        ("statement",)
+    )
+    family.children = {(name,): histogram for name, histogram in statement_timings.items()}
+    return (family,)
+
+
+registry.add_collector(_collect_statement_metrics)
+
+
+class UserRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def _execute(self, name: str, statement, params: dict):
+        start = time.perf_counter()
+        try:
+            return await self.session.execute(statement, params)
+        finally:
+            histogram = statement_timings.get(name)
+            if histogram is None:
+                histogram = statement_timings[name] = Histogram()
+            histogram.observe(time.perf_counter() - start)
+
+    async def get_by_email(self, email: str) -> User | None:
+        result = await self._execute("user_by_email", USER_BY_EMAIL, {"email": email})
+        return result.scalar_one_or_none()
+
+    async def get_by_id(self, user_id: int) -> User | None:
+        result = await self._execute("user_by_id", USER_BY_ID, {"user_id": user_id})
+        return result.scalar_one_or_none()
+
+    async def email_exists(self, email: str) -> bool:
+        result = await self._execute("user_id_by_email", USER_ID_BY_EMAIL, {"email": email})
+        return result.scalar_one_or_none() is not None
+
+    async def get_auth_state(self, user_id: int) -> tuple[int, bool] | None:
+        result = await self._execute("user_auth_state_by_id", USER_AUTH_STATE_BY_ID, {"user_id": user_id})
+        row = result.one_or_none()
+        return None if row is None else (row.token_version, row.is_active)
@@ -1,20 +1,84 @@
-from db.database import get_session
+from cache import TTLCache
+from config import settings
+from dataclasses import dataclass
+from db.database import (
+    async_session_maker,
+    get_read_session,
+    get_session,
+    open_read_session
+)
+from db.item_store import (
+    DatabaseItemStore,
+    MemoryItemStore,
+    memory_item_store
+)
 from db.models import User
+from db.repository import UserRepository
 from fastapi import (
     Depends, 
     HTTPException, 
     Request, 
     status
 )
+from revocation import revocation_list
 from security import verify_token
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
-async def get_current_user(
-    request: Request,
-    db: AsyncSession = Depends(get_session),
-) -> User:
+# Keyed by the token subject (email). Writes on this worker invalidate the
+# entry directly; other workers pick the change up once the TTL runs out.
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+# user id -> current token_version, or INACTIVE_TOKEN_VERSION for users that
+# are deactivated or gone. Bumps on this worker update it directly; other
+# workers re-read it from the database once the TTL runs out.
+INACTIVE_TOKEN_VERSION = -1
+token_versions = TTLCache(
+    maxsize=settings.TOKEN_VERSION_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_VERSION_CACHE_TTL_SECONDS
+)
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    id: int
+    email: str
+    role: str
+    token_version: int
+    jti: str
+    exp: int
+
+
+def _user_snapshot(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+async def _read_token_version(session: AsyncSession, user_id: int) -> int:
+    async with session:
+        state = await UserRepository(session).get_auth_state(user_id)
+    if state is None or not state[1]:
+        return INACTIVE_TOKEN_VERSION
+    return state[0]
+
+
+async def _current_token_version(request: Request, user_id: int, claimed_version: int) -> int:
+    version = token_versions.get(user_id)
+    if version is None:
+        version = await _read_token_version(await open_read_session(request), user_id)
+        token_versions.set(user_id, version)
+    if claimed_version > version:
+        # Versions only grow, so a newer signed claim proves this worker's
+        # entry (or the replica it came from) is stale: ask the primary.
+        version = await _read_token_version(async_session_maker(), user_id)
+        token_versions.set(user_id, version)
+    return version
+
+
+async def get_current_claims(request: Request) -> TokenClaims:
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -23,27 +87,51 @@ async def get_current_user(
         )
     try:
         payload = verify_token(token)
-        email = payload["sub"]
-        
-        result = await db.execute(select(User).where(User.email == email))
-        db_user = result.scalar_one_or_none()
-        if not db_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated"
-            )
-        return db_user
-    
+        claims = TokenClaims(
+            id=payload["uid"],
+            email=payload["sub"],
+            role=payload["role"],
+            token_version=payload["tv"],
+            jti=payload["jti"],
+            exp=payload["exp"]
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token invalid"
         )
+    if (
+        claims.token_version != await _current_token_version(request, claims.id, claims.token_version)
+        or await revocation_list.is_revoked(claims.jti)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalid"
+        )
+    return claims
+
+
+async def get_current_user(
+    claims: TokenClaims = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_read_session),
+) -> User:
+    snapshot = user_cache.get(claims.email)
+    if snapshot is not None:
+        return User(**snapshot)
+    
+    db_user = await UserRepository(db).get_by_email(claims.email)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    user_cache.set(claims.email, _user_snapshot(db_user))
+    return db_user
         
         
 async def get_current_admin(
-    current_user = Depends(get_current_user)
-):
+    current_user: TokenClaims = Depends(get_current_claims)
+) -> TokenClaims:
     if not current_user.role == "admin" and not current_user.role == "superadmin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -53,8 +141,8 @@ async def get_current_admin(
 
 
 async def get_current_superadmin(
-    current_user = Depends(get_current_user)
-):
+    current_user: TokenClaims = Depends(get_current_claims)
+) -> TokenClaims:
     if not current_user.role == "superadmin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -62,3 +150,18 @@ async def get_current_superadmin(
         )
     return current_user
 
+
+async def get_item_store(
+    db: AsyncSession = Depends(get_session),
+) -> DatabaseItemStore | MemoryItemStore:
+    if settings.ITEMS_BACKEND == "memory":
+        return memory_item_store
+    return DatabaseItemStore(db)
+
+
+async def get_item_read_store(
+    db: AsyncSession = Depends(get_read_session),
+) -> DatabaseItemStore | MemoryItemStore:
+    if settings.ITEMS_BACKEND == "memory":
+        return memory_item_store
+    return DatabaseItemStore(db)
@@ -0,0 +1,110 @@
+import base64
+import bcrypt
+import hashlib
+import hmac
+import os
+
+from config import settings
+
+
+class BcryptHasher:
+    algorithm = "bcrypt"
+    default_cost = 12
+    min_cost = 4
+    max_cost = 18
+
+    def __init__(self, cost: int | None = None) -> None:
+        self.cost = self.default_cost if cost is None else cost
+
+    @staticmethod
+    def identify(hashed_password: bytes) -> bool:
+        return hashed_password.startswith((b"$2a$", b"$2b$", b"$2y$"))
+
+    def hash(self, password: str) -> bytes:
+        return bcrypt.hashpw(password=password.encode(), salt=bcrypt.gensalt(rounds=self.cost))
+
+    def verify(self, password: str, hashed_password: bytes) -> bool:
+        return bcrypt.checkpw(password=password.encode(), hashed_password=hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        # $2b$12$... -> the two digits after the version are the rounds.
+        return int(hashed_password[4:6]) != self.cost
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+    # The cost is log2 of scrypt's N parameter.
+    default_cost = 15
+    min_cost = 10
+    max_cost = 22
+    block_size = 8
+    parallelism = 1
+    prefix = b"$scrypt$"
+
+    def __init__(self, cost: int | None = None) -> None:
+        self.cost = self.default_cost if cost is None else cost
+
+    @classmethod
+    def identify(cls, hashed_password: bytes) -> bool:
+        return hashed_password.startswith(cls.prefix)
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+        n = 2 ** log_n
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p,
+            maxmem=128 * r * (n + p + 2) + 2 ** 20, dklen=32
+        )
+
+    @staticmethod
+    def _parse(hashed_password: bytes) -> tuple[int, int, int, bytes, bytes]:
+        # $scrypt$ln=15,r=8,p=1$<salt>$<hash>
+        _, _, params, salt, digest = hashed_password.split(b"$")
+        values = dict(item.split(b"=") for item in params.split(b","))
+        return (
+            int(values[b"ln"]), int(values[b"r"]), int(values[b"p"]),
+            base64.b64decode(salt), base64.b64decode(digest)
+        )
+
+    def hash(self, password: str) -> bytes:
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.cost, self.block_size, self.parallelism)
+        params = f"ln={self.cost},r={self.block_size},p={self.parallelism}".encode()
+        return b"$".join((b"", b"scrypt", params, base64.b64encode(salt), base64.b64encode(digest)))
+
+    def verify(self, password: str, hashed_password: bytes) -> bool:
+        log_n, r, p, salt, digest = self._parse(hashed_password)
+        return hmac.compare_digest(self._derive(password, salt, log_n, r, p), digest)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        log_n, r, p, _, _ = self._parse(hashed_password)
+        return (log_n, r, p) != (self.cost, self.block_size, self.parallelism)
+
+
+HASHERS: dict[str, type[BcryptHasher] | type[ScryptHasher]] = {
+    BcryptHasher.algorithm: BcryptHasher,
+    ScryptHasher.algorithm: ScryptHasher,
+}
+
+
+def get_hasher(algorithm: str, cost: int | None = None) -> BcryptHasher | ScryptHasher:
+    try:
+        return HASHERS[algorithm](cost)
+    except KeyError:
+        raise ValueError(f"Unknown password hasher {algorithm!r}")
+
+
+default_hasher = get_hasher(settings.PASSWORD_HASHER, settings.PASSWORD_HASH_COST)
+
+
+def identify_hasher(hashed_password: bytes) -> BcryptHasher | ScryptHasher:
+    if default_hasher.identify(hashed_password):
+        return default_hasher
+    for hasher_cls in HASHERS.values():
+        if hasher_cls.identify(hashed_password):
+            return hasher_cls()
+    raise ValueError("Unknown password hash format")
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    return not default_hasher.identify(hashed_password) or default_hasher.needs_rehash(hashed_password)
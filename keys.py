@@ -0,0 +1,58 @@
+import os
+
+from cryptography.hazmat.primitives import serialization
+from dataclasses import dataclass
+from jwt.algorithms import get_default_algorithms
+from typing import Any
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    public_key: Any
+    # None for retired keys that are only kept to verify older tokens.
+    private_key: Any = None
+
+
+class KeyRing:
+    def __init__(self, keys: dict[str, SigningKey], active_kid: str) -> None:
+        if active_kid not in keys or keys[active_kid].private_key is None:
+            raise ValueError(f"No private key for the active key id {active_kid!r}")
+        self.keys = keys
+        self.active = keys[active_kid]
+        self._jwks = {"keys": [self._to_jwk(key) for key in keys.values()]}
+
+    # Directory layout: <kid>.pem holds a private key that can sign;
+    # <kid>.pub.pem holds the public key of a retired one. The active kid
+    # defaults to the last one in sort order, so date-like kids rotate by
+    # simply adding a newer file.
+    @classmethod
+    def load(cls, directory: str, algorithm: str, active_kid: str | None = None) -> "KeyRing":
+        keys: dict[str, SigningKey] = {}
+        for file_name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, file_name)
+            with open(path, "rb") as file:
+                data = file.read()
+            if file_name.endswith(".pub.pem"):
+                kid = file_name.removesuffix(".pub.pem")
+                keys.setdefault(kid, SigningKey(kid, algorithm, serialization.load_pem_public_key(data)))
+            elif file_name.endswith(".pem"):
+                kid = file_name.removesuffix(".pem")
+                private_key = serialization.load_pem_private_key(data, password=None)
+                keys[kid] = SigningKey(kid, algorithm, private_key.public_key(), private_key)
+        signing_kids = [kid for kid, key in keys.items() if key.private_key is not None]
+        if not signing_kids:
+            raise ValueError(f"No private signing keys found in {directory}")
+        return cls(keys, active_kid or signing_kids[-1])
+
+    def _to_jwk(self, key: SigningKey) -> dict[str, Any]:
+        jwk = get_default_algorithms()[key.algorithm].to_jwk(key.public_key, as_dict=True)
+        jwk.update({"kid": key.kid, "alg": key.algorithm, "use": "sig"})
+        return jwk
+
+    def public_key(self, kid: str) -> Any:
+        return self.keys[kid].public_key
+
+    def jwks(self) -> dict[str, Any]:
+        return self._jwks
@@ -1,19 +1,71 @@
+import asyncio
+import logging
 import uvicorn
 
-from contextlib import asynccontextmanager
-from db.database import engine
-from db.models import Base
+from contextlib import (
+    asynccontextmanager,
+    suppress
+)
+from config import settings
+from db.database import (
+    engine,
+    mark_replica_down,
+    replica_engines
+)
+from db.item_store import memory_item_store
+from db.migrations import run_migrations
+from db.pool import warm_up_pool
 from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse
+from metrics import registry
+from middleware import (
+    MetricsMiddleware,
+    ProfilerMiddleware
+)
+from revocation import revocation_list
 from routers.admin import router as admin_router
 from routers.authentication import router as auth_router 
 from routers.items import router as item_router
+from security import (
+    get_key_ring,
+    password_hashing_pool
+)
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as connect:
-        await connect.run_sync(Base.metadata.create_all)
+    get_key_ring()
+    if settings.DB_MIGRATE_ON_STARTUP:
+        await run_migrations(engine)
+    if settings.ITEMS_BACKEND == "memory":
+        memory_item_store.load_snapshot()
+    warmup = min(settings.DB_POOL_WARMUP_CONNECTIONS, settings.DB_POOL_SIZE)
+    if warmup > 0:
+        await warm_up_pool(engine, warmup)
+        # A replica that is down must not keep the app from starting; reads
+        # fall back to the primary until it answers again.
+        for index, replica_engine in enumerate(replica_engines):
+            try:
+                await warm_up_pool(replica_engine, warmup)
+            except (OSError, TimeoutError, SQLAlchemyError):
+                logger.exception("Warming up the pool of replica %d failed", index)
+                mark_replica_down(index)
+    await revocation_list.rebuild()
+    revocation_refresh = asyncio.create_task(
+        revocation_list.refresh_periodically(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+    )
     yield
+    revocation_refresh.cancel()
+    with suppress(asyncio.CancelledError):
+        await revocation_refresh
+    password_hashing_pool.shutdown()
+    if settings.ITEMS_BACKEND == "memory":
+        memory_item_store.save_snapshot()
+    for pool_engine in (engine, *replica_engines):
+        await pool_engine.dispose()
     #async with engine.begin() as connect:
     #    await connect.run_sync(Base.metadata.drop_all)
     
@@ -23,6 +75,22 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(admin_router)
 app.include_router(auth_router)
 app.include_router(item_router)
+app.add_middleware(ProfilerMiddleware, sample_rate=settings.PROFILER_SAMPLE_RATE)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/.well-known/jwks.json", tags=["Keys"], description="Public keys for verifying access tokens")
+async def get_jwks(response: Response) -> dict:
+    response.headers["Cache-Control"] = "public, max-age=300"
+    key_ring = get_key_ring()
+    return key_ring.jwks() if key_ring is not None else {"keys": []}
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics() -> PlainTextResponse:
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
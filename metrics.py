@@ -0,0 +1,153 @@
+import bisect
+
+from collections.abc import (
+    Callable,
+    Iterable,
+    Iterator
+)
+from typing import Any
+
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus a final one for values above the last bound.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        cumulative = {}
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[str(bound)] = total
+        cumulative["+Inf"] = self.count
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+# For operations well under a millisecond, such as JWT encoding and decoding.
+FAST_LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025
+)
+
+
+class HistogramFamily:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.children: dict[tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        histogram = self.children.get(values)
+        if histogram is None:
+            histogram = self.children[values] = Histogram(self.buckets)
+        return histogram
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for values, histogram in self.children.items():
+            labels = dict(zip(self.label_names, values))
+            for bound, count in histogram.snapshot()["buckets"].items():
+                yield f"{self.name}_bucket", {**labels, "le": bound}, count
+            yield f"{self.name}_sum", labels, histogram.sum
+            yield f"{self.name}_count", labels, histogram.count
+
+
+class CounterFamily:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.children: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        self.children[values] = self.children.get(values, 0) + amount
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for values, value in self.children.items():
+            yield self.name, dict(zip(self.label_names, values)), value
+
+
+class GaugeFamily(CounterFamily):
+    kind = "gauge"
+
+    def set(self, *values: str, value: float) -> None:
+        self.children[values] = value
+
+
+MetricFamily = HistogramFamily | CounterFamily | GaugeFamily
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape_label_value(str(label))}"' for key, label in labels.items())
+        name = f"{name}{{{label_text}}}"
+    return f"{name} {value}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._families: list[MetricFamily] = []
+        # Called on every scrape for values that live elsewhere, such as
+        # the pool counters; each returns freshly built families.
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS
+    ) -> HistogramFamily:
+        family = HistogramFamily(name, documentation, label_names, buckets)
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> CounterFamily:
+        family = CounterFamily(name, documentation, label_names)
+        self._families.append(family)
+        return family
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        # Prometheus text exposition format, version 0.0.4.
+        lines = []
+        families = [*self._families, *(family for collector in self._collectors for family in collector())]
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(_format_sample(*sample) for sample in family.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Per process: with several workers every scrape sees the worker that
+# answered it, so scrape each worker or run one per container.
+registry = MetricsRegistry()
@@ -0,0 +1,136 @@
+import cProfile
+import random
+import secrets
+import time
+
+from dependencies import get_current_claims
+from fastapi import (
+    HTTPException,
+    Request
+)
+from metrics import registry
+from profiling import (
+    ProfileRecord,
+    profile_buffer
+)
+from starlette.types import (
+    ASGIApp,
+    Message,
+    Receive,
+    Scope,
+    Send
+)
+
+
+http_request_seconds = registry.histogram(
+    "http_request_seconds",
+    "Time from receiving a request to sending the last byte of the response",
+    ("method", "route")
+)
+http_responses = registry.counter(
+    "http_responses_total",
+    "Responses sent, by route and status code",
+    ("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    # Plain ASGI instead of BaseHTTPMiddleware: no extra task per request
+    # and streamed bodies are timed until they finish.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; labelling by
+            # its template keeps /item/1 and /item/2 in one series.
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_request_seconds.labels(scope["method"], route_path).observe(time.perf_counter() - start)
+            http_responses.inc(scope["method"], route_path, str(status_code))
+
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+class ProfilerMiddleware:
+    # cProfile sees everything the event loop runs while it is enabled, so
+    # requests served concurrently show up in the profile too, and only one
+    # request is profiled at a time. Work in the hashing pool threads or
+    # processes is not included.
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.0) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self._busy = False
+
+    async def _admin_email(self, scope: Scope) -> str | None:
+        try:
+            claims = await get_current_claims(Request(scope))
+        except HTTPException:
+            return None
+        return claims.email if claims.role in ("admin", "superadmin") else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._busy:
+            await self.app(scope, receive, send)
+            return
+
+        requested_by = None
+        if any(name == PROFILE_HEADER for name, _ in scope["headers"]):
+            requested_by = await self._admin_email(scope)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if (requested_by is None and not sampled) or self._busy:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process.
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profile_id = secrets.token_hex(8)
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if requested_by is not None:
+                    message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            self._busy = False
+            profile_buffer.add(ProfileRecord(
+                id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                status_code=status_code,
+                duration=time.perf_counter() - start,
+                requested_by=requested_by,
+                profile=profiler
+            ))
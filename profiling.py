@@ -0,0 +1,68 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from collections import deque
+from config import settings
+from dataclasses import (
+    dataclass,
+    field
+)
+from typing import Any
+
+
+@dataclass
+class ProfileRecord:
+    id: str
+    method: str
+    path: str
+    status_code: int
+    duration: float
+    # Email of the admin who asked for it; None for sampled traffic.
+    requested_by: str | None
+    profile: cProfile.Profile = field(repr=False)
+    created_at: float = field(default_factory=time.time)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "duration_ms": self.duration * 1000,
+            "requested_by": self.requested_by,
+            "created_at": self.created_at,
+        }
+
+    def as_text(self, sort_by: str = "cumulative", limit: int = 60) -> str:
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats(sort_by).print_stats(limit)
+        return stream.getvalue()
+
+    def as_pstats(self) -> bytes:
+        # Same bytes as Profile.dump_stats, loadable with pstats or snakeviz.
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+class ProfileBuffer:
+    def __init__(self, maxlen: int) -> None:
+        # Oldest profiles fall out once the buffer is full.
+        self._records: deque[ProfileRecord] = deque(maxlen=maxlen)
+
+    def add(self, record: ProfileRecord) -> None:
+        self._records.append(record)
+
+    def get(self, profile_id: str) -> ProfileRecord | None:
+        for record in self._records:
+            if record.id == profile_id:
+                return record
+        return None
+
+    def summaries(self) -> list[dict[str, Any]]:
+        return [record.summary() for record in reversed(self._records)]
+
+
+profile_buffer = ProfileBuffer(settings.PROFILER_BUFFER_SIZE)
@@ -0,0 +1,198 @@
+import math
+import threading
+import time
+import uuid
+
+from collections import deque
+from config import settings
+from fastapi import (
+    HTTPException,
+    status
+)
+from typing import Protocol
+
+
+class RateLimitBackend(Protocol):
+    # Records an attempt at `now` and returns the attempts inside the window.
+    async def hit(self, key: str, now: float, window: float) -> int: ...
+
+    # Returns (blocked_until, strikes); (0.0, 0) when the key is not blocked.
+    async def get_block(self, key: str) -> tuple[float, int]: ...
+
+    async def set_block(self, key: str, blocked_until: float, strikes: int, ttl: float) -> None: ...
+
+    async def reset(self, key: str) -> None: ...
+
+
+class _Shard:
+    __slots__ = ("lock", "hits", "blocks", "operations")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.hits: dict[str, deque[float]] = {}
+        self.blocks: dict[str, tuple[float, int, float]] = {}
+        self.operations = 0
+
+
+class InMemoryRateLimitBackend:
+    PURGE_EVERY = 1024
+
+    def __init__(self, shards: int = 16, max_window_hits: int = 1000) -> None:
+        self._shards = [_Shard() for _ in range(shards)]
+        # Each key keeps at most this many timestamps; anything above the
+        # configured limit is over the limit either way.
+        self.max_window_hits = max_window_hits
+        self._window = 0.0
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _maybe_purge(self, shard: _Shard, now: float) -> None:
+        shard.operations += 1
+        if shard.operations % self.PURGE_EVERY:
+            return
+        for key in [key for key, hits in shard.hits.items() if not hits or hits[-1] <= now - self._window]:
+            del shard.hits[key]
+        for key in [key for key, (_, _, expires_at) in shard.blocks.items() if expires_at <= now]:
+            del shard.blocks[key]
+
+    async def hit(self, key: str, now: float, window: float) -> int:
+        shard = self._shard(key)
+        with shard.lock:
+            self._window = max(self._window, window)
+            hits = shard.hits.get(key)
+            if hits is None:
+                hits = shard.hits[key] = deque(maxlen=self.max_window_hits)
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            hits.append(now)
+            self._maybe_purge(shard, now)
+            return len(hits)
+
+    async def get_block(self, key: str) -> tuple[float, int]:
+        shard = self._shard(key)
+        with shard.lock:
+            block = shard.blocks.get(key)
+            if block is None:
+                return 0.0, 0
+            blocked_until, strikes, expires_at = block
+            if expires_at <= time.time():
+                del shard.blocks[key]
+                return 0.0, 0
+            return blocked_until, strikes
+
+    async def set_block(self, key: str, blocked_until: float, strikes: int, ttl: float) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.blocks[key] = (blocked_until, strikes, time.time() + ttl)
+
+    async def reset(self, key: str) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.hits.pop(key, None)
+            shard.blocks.pop(key, None)
+
+
+class RedisRateLimitBackend:
+    def __init__(self, client, prefix: str = "login-throttle:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, key: str, now: float, window: float) -> int:
+        hits_key = f"{self.prefix}hits:{key}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(hits_key, "-inf", now - window)
+            pipe.zadd(hits_key, {uuid.uuid4().hex: now})
+            pipe.zcard(hits_key)
+            pipe.expire(hits_key, math.ceil(window))
+            _, _, count, _ = await pipe.execute()
+        return int(count)
+
+    async def get_block(self, key: str) -> tuple[float, int]:
+        block = await self.client.hgetall(f"{self.prefix}block:{key}")
+        if not block:
+            return 0.0, 0
+        return float(block[b"until"]), int(block[b"strikes"])
+
+    async def set_block(self, key: str, blocked_until: float, strikes: int, ttl: float) -> None:
+        block_key = f"{self.prefix}block:{key}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(block_key, mapping={"until": blocked_until, "strikes": strikes})
+            pipe.expire(block_key, math.ceil(ttl))
+            await pipe.execute()
+
+    async def reset(self, key: str) -> None:
+        await self.client.delete(f"{self.prefix}hits:{key}", f"{self.prefix}block:{key}")
+
+
+class LoginThrottle:
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        max_attempts_per_ip: int,
+        max_attempts_per_email: int,
+        window_seconds: float,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float
+    ) -> None:
+        self.backend = backend
+        self.max_attempts_per_ip = max_attempts_per_ip
+        self.max_attempts_per_email = max_attempts_per_email
+        self.window_seconds = window_seconds
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def _reject(self, retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def check(self, client_ip: str, email: str) -> None:
+        now = time.time()
+        limits = (
+            (f"ip:{client_ip}", self.max_attempts_per_ip),
+            (f"email:{email.lower()}", self.max_attempts_per_email),
+        )
+        blocks = {}
+        for key, _ in limits:
+            blocked_until, strikes = await self.backend.get_block(key)
+            if blocked_until > now:
+                raise self._reject(blocked_until - now)
+            blocks[key] = strikes
+
+        for key, limit in limits:
+            if await self.backend.hit(key, now, self.window_seconds) > limit:
+                # Each consecutive block doubles; strikes are forgotten once
+                # the key stays quiet for backoff_max_seconds.
+                strikes = blocks[key] + 1
+                delay = min(self.backoff_base_seconds * 2 ** (strikes - 1), self.backoff_max_seconds)
+                await self.backend.set_block(key, now + delay, strikes, ttl=delay + self.backoff_max_seconds)
+                raise self._reject(delay)
+
+    async def reset(self, email: str) -> None:
+        await self.backend.reset(f"email:{email.lower()}")
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.LOGIN_RATE_LIMIT_BACKEND == "redis":
+        # Optional dependency, only needed for multi-worker deployments.
+        import redis.asyncio as redis
+
+        return RedisRateLimitBackend(redis.from_url(settings.LOGIN_RATE_LIMIT_REDIS_URL))
+    return InMemoryRateLimitBackend()
+
+
+login_throttle = LoginThrottle(
+    backend=create_rate_limit_backend(),
+    max_attempts_per_ip=settings.LOGIN_MAX_ATTEMPTS_PER_IP,
+    max_attempts_per_email=settings.LOGIN_MAX_ATTEMPTS_PER_EMAIL,
+    window_seconds=settings.LOGIN_ATTEMPT_WINDOW_SECONDS,
+    backoff_base_seconds=settings.LOGIN_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.LOGIN_BACKOFF_MAX_SECONDS
+)
+
+
+async def get_login_throttle() -> LoginThrottle:
+    return login_throttle
@@ -0,0 +1,11 @@
+import orjson
+
+from starlette.responses import JSONResponse
+from typing import Any
+
+
+class ORJSONResponse(JSONResponse):
+    # Kept here rather than imported from fastapi.responses, where it is
+    # deprecated in newer releases and warns on every response.
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import math
+
+from config import settings
+from db.database import async_session_maker
+from db.models import RevokedToken
+from sqlalchemy import (
+    delete,
+    select
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenRevocationList:
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.store_lookups = 0
+        self._bloom = BloomFilter(capacity, error_rate)
+        # Revoked on this worker and not yet seen by a rebuild; re-added to
+        # every new filter so a rebuild racing a logout cannot drop them.
+        self._recent: set[str] = set()
+
+    async def revoke(self, session: AsyncSession, jti: str, expires_at: int) -> None:
+        # Not committed here, so callers can revoke in the same transaction
+        # as their other changes. A filter entry whose row never commits only
+        # costs a store lookup.
+        await session.execute(
+            insert(RevokedToken)
+            .values(jti=jti, expires_at=datetime.datetime.fromtimestamp(expires_at, tz=datetime.timezone.utc))
+            .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        )
+        self._recent.add(jti)
+        self._bloom.add(jti)
+
+    async def is_revoked(self, jti: str) -> bool:
+        # The filter has no false negatives, so the store is only asked about
+        # revoked tokens and the rare false positive.
+        if jti not in self._bloom:
+            return False
+        self.store_lookups += 1
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(RevokedToken.jti)
+                .where(RevokedToken.jti == jti, RevokedToken.expires_at > datetime.datetime.now(tz=datetime.timezone.utc))
+            )
+            return result.scalar_one_or_none() is not None
+
+    async def rebuild(self) -> None:
+        # Drops expired entries and picks up revocations made by other workers.
+        seen = set(self._recent)
+        async with async_session_maker() as session:
+            await session.execute(
+                delete(RevokedToken)
+                .where(RevokedToken.expires_at <= datetime.datetime.now(tz=datetime.timezone.utc))
+            )
+            await session.commit()
+            result = await session.stream_scalars(select(RevokedToken.jti))
+            jtis = [jti async for jti in result]
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in (*jtis, *self._recent):
+            bloom.add(jti)
+        self._bloom = bloom
+        self._recent -= seen
+
+    async def refresh_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rebuild()
+            except Exception:
+                # Keep serving with the current filter; retry next interval.
+                logger.exception("Rebuilding the token revocation filter failed")
+
+
+revocation_list = TokenRevocationList(
+    capacity=settings.TOKEN_REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE
+)
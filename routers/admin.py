@@ -1,30 +1,75 @@
-from db.database import get_session
+from db.database import (
+    engine,
+    get_read_session,
+    get_session,
+    open_read_session,
+    replica_engines
+)
+from db.export import (
+    EXPORT_FORMATS,
+    USER_EXPORT_COLUMNS,
+    stream_export,
+    user_export_query
+)
 from db.models import User
+from db.pool import pool_stats
+from db.repository import (
+    UserRepository,
+    statement_timings
+)
+from db.queries import (
+    MIN_SUBSTRING_SEARCH_LENGTH,
+    USER_SEARCH_FIELDS,
+    apply_keyset,
+    apply_user_filters,
+    apply_user_order,
+    decode_cursor,
+    encode_cursor,
+    id_ranges_predicate,
+    parse_id_ranges,
+    parse_user_sort,
+    user_prefix_search,
+    user_substring_search
+)
 from dependencies import (
+    INACTIVE_TOKEN_VERSION,
     get_current_admin, 
-    get_current_superadmin
+    get_current_superadmin,
+    token_versions,
+    user_cache
 )
 from fastapi import (
     APIRouter,
     Depends, 
     HTTPException,
     Query, 
+    Request,
+    Response,
     status
 )
+from fastapi.responses import (
+    PlainTextResponse,
+    StreamingResponse
+)
+from profiling import profile_buffer
 from pydantic import EmailStr
+from responses import ORJSONResponse
 from schemas.users import (
     UserRegister,
     UserResponse
 )
-from security import hash_password
+from security import (
+    hash_password_async,
+    token_cache
+)
 from sqlalchemy import (
+    case,
     select,
-    desc,
-    asc, 
+    union_all,
     update
 )
-from sqlalchemy.orm import load_only
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from typing import Any
 
 
@@ -37,8 +82,7 @@ async def create_admin(
     db: AsyncSession = Depends(get_session),
     superadmin = Depends(get_current_superadmin),
 ) -> dict[str, str]:
-    result = await db.execute(select(User).where(User.email == user.email))
-    if result.scalar_one_or_none():
+    if await UserRepository(db).email_exists(user.email):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="An admin with this email already exists"
@@ -46,7 +90,7 @@ async def create_admin(
     db_admin = User(
         username=user.username,
         email=user.email,
-        password=hash_password(user.password),
+        password=await hash_password_async(user.password),
         role="admin"
     )
     
@@ -68,9 +112,8 @@ async def change_role(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wrong role. The role must be either admin or user"
         )
-    old_role_stmt = select(User).where(User.email == email)
-    result = await db.execute(old_role_stmt)
-    data_user = result.scalar_one_or_none()
+    users = UserRepository(db)
+    data_user = await users.get_by_email(email)
     if not data_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -83,15 +126,17 @@ async def change_role(
     update_stmt = (
         update(User)
         .where(User.email == email)
-        .values(role=new_role)
+        .values(role=new_role, token_version=User.token_version + 1)
+        .returning(User.token_version)
     )
         
-    await db.execute(update_stmt)
+    result = await db.execute(update_stmt)
+    new_token_version = result.scalar_one()
     await db.commit()
+    token_versions.set(data_user.id, new_token_version)
+    user_cache.pop(email)
     
-    updated_user_stmt = select(User).where(User.email == email)
-    result = await db.execute(updated_user_stmt)
-    updated_user = result.scalar_one()
+    updated_user = await users.get_by_email(email)
     user_info = {
         "username": updated_user.username,
         "id": updated_user.id,
@@ -106,10 +151,33 @@ async def change_role(
             "new_role": updated_user.role}
     
 
-@router.get("/users", description="Get users list with filtering and sorting", response_model=list[UserResponse])
+async def _stream_users(request: Request, query, file_format: str, compress: bool = False):
+    # Uses its own session so the server-side cursor stays open for as long
+    # as the response body is being sent.
+    session = await open_read_session(request)
+    async with session:
+        async for chunk in stream_export(session, query, file_format, compress):
+            yield chunk
+
+
+@router.get(
+    "/users", 
+    description="""Get users list with filtering and sorting. When limit is set and more rows may follow,
+                   the X-Next-Cursor response header holds the cursor for the next page.""",
+    response_model=list[UserResponse]
+)
 async def get_all_users(
+    request: Request,
     limit: int = Query(None, ge=0),
     offset: int = Query(default=0, ge=0),
+    cursor: str = Query(
+        default=None,
+        description="Opaque cursor from the X-Next-Cursor header of the previous page. Use the same sort_by"
+    ),
+    stream: bool = Query(
+        default=False,
+        description="Stream every matching user as NDJSON instead of returning a JSON array"
+    ),
     is_active: bool = Query(None, description="True or False or nothing"),
     roles: str = Query(
         default=None, 
@@ -119,36 +187,131 @@ async def get_all_users(
         default=None, 
         description='''You must specify the sorting field and, separated by a colon, how to sort(case does not matter).
                        Example:id:desc,username:ASC,is_active:DeSc'''),
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     admin = Depends(get_current_admin),
 ):
-    query = select(User)
+    if cursor and offset:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either cursor or offset, not both"
+        )
     try:
-        if limit:
-            query = query.limit(limit)
-        if offset:
-            query = query.offset(offset)
-        if is_active is True or is_active is False:
-            query = query.where(User.is_active == is_active)
-        if roles:
-            query = query.where(User.role.in_(roles.split(","))) 
+        order = parse_user_sort(sort_by)
+        query = apply_user_filters(select(*USER_EXPORT_COLUMNS), is_active, roles)
+        if cursor:
+            query = apply_keyset(query, order, decode_cursor(order, cursor))
+        query = apply_user_order(query, order)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid filtering, sorting or cursor data was passed"
+        )
+    if limit:
+        query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
         
-        if sort_by:
-            sort_field = sort_by.split(",")
-            for field in sort_field:
-                field_name, sort_order = field.split(":")
-                
-                column = getattr(User, field_name.lower(), None)
-                if column:
-                    query = query.order_by(desc(column) if sort_order.lower() == "desc" else asc(column))
-                    
-        result = await db.execute(query)
-    except ValueError:
+    if stream:
+        return StreamingResponse(_stream_users(request, query, "ndjson"), media_type="application/x-ndjson")
+    
+    # Only the UserResponse columns are selected and the rows go straight to
+    # orjson; returning a response skips response_model re-validation.
+    result = await db.execute(query)
+    users = result.all()
+    response = ORJSONResponse([user._asdict() for user in users])
+    if limit and len(users) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(order, users[-1])
+    return response
+
+
+@router.get("/users/export", description="Download every matching user as CSV or NDJSON, optionally gzip-compressed")
+async def export_users(
+    request: Request,
+    file_format: str = Query("csv", alias="format", description="csv or ndjson"),
+    compress: bool = Query(False, alias="gzip", description="Compress the file with gzip"),
+    is_active: bool = Query(None, description="True or False or nothing"),
+    roles: str = Query(
+        default=None, 
+        description="Select the desired roles: admin, superadmin, user. Example: admin,user"
+    ),
+    admin = Depends(get_current_admin),
+) -> StreamingResponse:
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Wrong format. The format must be one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    file_name = f"users.{file_format}.gz" if compress else f"users.{file_format}"
+    if compress:
+        media_type = "application/gzip"
+    else:
+        media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_users(request, user_export_query(is_active, roles), file_format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+def _search_rank(row, term: str, substring: bool) -> tuple:
+    # Exact matches first, then prefix matches in index order, then
+    # substrings by trigram similarity. Each key follows the ORDER BY of its
+    # subquery, so the top of every LIMITed subquery is what gets ranked.
+    if substring:
+        return (2, -row.score, row.id)
+    value = getattr(row, row.matched_field).lower()
+    return (0 if value == term else 1, value, row.id)
+
+
+@router.get(
+    "/users/search",
+    description="""Find users whose username or email starts with or contains the search term, best matches first.
+                   Substring matching needs at least 3 characters; shorter terms match by prefix""",
+    response_model=list[UserResponse]
+)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100, description="Search term, case does not matter"),
+    fields: str = Query("username,email", description="Fields to search: username, email. Example: username,email"),
+    limit: int = Query(20, ge=1, le=100),
+    is_active: bool = Query(None, description="True or False or nothing"),
+    roles: str = Query(
+        default=None, 
+        description="Select the desired roles: admin, superadmin, user. Example: admin,user"
+    ),
+    db: AsyncSession = Depends(get_read_session),
+    admin = Depends(get_current_admin),
+):
+    term = q.strip().lower()
+    search_fields = [field.strip().lower() for field in fields.split(",")]
+    if not term or not search_fields or any(field not in USER_SEARCH_FIELDS for field in search_fields):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid filtering or sorting data was passed"
+            detail=f"Invalid search data. Fields must be among: {', '.join(USER_SEARCH_FIELDS)}"
+        )
+    query = apply_user_filters(select(*USER_EXPORT_COLUMNS), is_active, roles)
+    
+    # Every field is searched by its own LIMITed, index-ordered subquery, and
+    # the small union is ranked here. Substring search only fills what the
+    # prefix matches leave of the limit.
+    ranked: dict[int, tuple] = {}
+    
+    async def collect(searches, substring: bool) -> None:
+        result = await db.execute(union_all(*searches) if len(searches) > 1 else searches[0])
+        for row in result:
+            rank = _search_rank(row, term, substring)
+            if row.id not in ranked or rank < ranked[row.id][0]:
+                ranked[row.id] = (rank, {column.key: getattr(row, column.key) for column in USER_EXPORT_COLUMNS})
+    
+    await collect([user_prefix_search(query, field, term, limit) for field in search_fields], substring=False)
+    if len(ranked) < limit and len(term) >= MIN_SUBSTRING_SEARCH_LENGTH:
+        remaining_query = query.where(User.id.not_in(list(ranked))) if ranked else query
+        await collect(
+            [user_substring_search(remaining_query, field, term, limit - len(ranked)) for field in search_fields],
+            substring=True
         )
-    return result.scalars().all()
+    
+    users = sorted(ranked.values(), key=lambda item: item[0])[:limit]
+    return ORJSONResponse([user for _, user in users])
+
 
 @router.patch("/users/status", description="Activate and deactivate one or more users")
 async def activate_or_deactivate_users(
@@ -159,82 +322,124 @@ async def activate_or_deactivate_users(
     ),
     db: AsyncSession = Depends(get_session),
     user = Depends(get_current_admin),
-) -> dict[str, str]:
+) -> dict[str, Any]:
     try:
-        if "-" in ids:
-            ranges = ids.split(",")
-            current_ids = set()
-            for r in ranges:
-                mid = r.split("-")
-                if len(mid) == 1:
-                    id = int(mid[0])
-                    current_ids.add(id)
-                elif len(mid) == 2:
-                    start, end = map(int, r.split("-"))
-                    current_ids.update(set(range(start, end+1)))
-                else:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Invalid data"
-                    )
-        else:
-            current_ids = list(map(int, ids.split(",")))
-    except (ValueError, TypeError):
+        id_ranges = parse_id_ranges(ids)
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid data"
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"An error occurred {e}"
-        )
-        
+    
     if user.role == "superadmin":
-        select_stmt = (
-            select(User.id, User.username, User.email, User.is_active)
-            .where(User.id.in_(current_ids), User.role != "superadmin")
-        )
+        role_filter = User.role != "superadmin"
     else:
-        select_stmt = (
-            select(User.id, User.username, User.email, User.is_active)
-            .where(User.id.in_(current_ids), User.role.not_in(["admin", "superadmin"]))
-        )
-        
-    result = await db.execute(select_stmt)
-    users_before = result.mappings().all()
+        role_filter = User.role.not_in(["admin", "superadmin"])
     
-    if user.role == "superadmin":
-        update_stmt = (
-            update(User)
-            .where(User.id.in_(current_ids), User.role != "superadmin")
-            .values(is_active=active)
+    # Joining the table to itself makes RETURNING see the row both before
+    # (old_user) and after the update, so the report needs no extra query.
+    old_user = aliased(User)
+    update_stmt = (
+        update(User)
+        .where(User.id == old_user.id, id_ranges_predicate(User.id, id_ranges), role_filter)
+        # Only a real change logs the user out; re-activating an active user
+        # keeps their tokens.
+        .values(
+            is_active=active,
+            token_version=case((User.is_active != active, User.token_version + 1), else_=User.token_version)
         )
-    else:
-        result = await db.execute(select(User).where(User.role == "superadmin"))
-        superadmin = result.scalar_one()
-        if superadmin.id in current_ids:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"You cannot deactivate a user with the superadmin(id={superadmin.id}) role."
-            )
-        update_stmt = (
-            update(User)
-            .where(User.id.in_(current_ids), User.role.not_in(["admin", "superadmin"]))
-            .values(is_active=active)
-        )    
-    await db.execute(update_stmt)
+        .returning(
+            User.id,
+            User.username,
+            User.email,
+            User.token_version,
+            old_user.is_active.label("old_is_active")
+        )
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(update_stmt)
+    updated_users = result.mappings().all()
     await db.commit()
     
     info = []
-    for user_data in users_before:
+    for user_data in updated_users:
+        if user_data["old_is_active"] != active:
+            token_versions.set(user_data["id"], user_data["token_version"] if active else INACTIVE_TOKEN_VERSION)
+            user_cache.pop(user_data["email"])
         info.append({
             "id": user_data["id"],
             "username": user_data["username"],
             "email": user_data["email"],
-            "old_is_active": user_data["is_active"],
+            "old_is_active": user_data["old_is_active"],
             "new_is_active": active
         })
     return {"result": "Successfully",
-            "info": f"{info}"}
+            "info": info}
+
+
+@router.get("/cache", description="Size and hit rate of the in-process user and token caches")
+async def get_cache_stats(
+    admin = Depends(get_current_admin),
+) -> dict[str, Any]:
+    return {"users": user_cache.stats(),
+            "tokens": token_cache.stats()}
+
 
+@router.get("/db/pool", description="Connection pool usage, wait times and overflow events per database")
+async def get_pool_stats(
+    admin = Depends(get_current_admin),
+) -> dict[str, Any]:
+    return {pool_engine.sync_engine.pool.metrics.name: pool_stats(pool_engine)
+            for pool_engine in (engine, *replica_engines)}
+
+
+@router.get("/db/statements", description="Execution time histograms of the user lookup statements")
+async def get_statement_stats(
+    admin = Depends(get_current_admin),
+) -> dict[str, Any]:
+    return {name: histogram.snapshot() for name, histogram in statement_timings.items()}
+
+
+@router.get("/profiles", description="Profiled requests kept in the ring buffer, newest first")
+async def get_profiles(
+    admin = Depends(get_current_admin),
+) -> list[dict[str, Any]]:
+    return profile_buffer.summaries()
+
+
+@router.get(
+    "/profiles/{profile_id}", 
+    description="""Download one profile: format=text for the pstats report, format=pstats for a binary file
+                   that pstats or snakeviz can open"""
+)
+async def download_profile(
+    profile_id: str,
+    file_format: str = Query("text", alias="format", description="text or pstats"),
+    sort_by: str = Query("cumulative", description="pstats sort key for the text report: cumulative, tottime, calls"),
+    limit: int = Query(60, ge=1, description="Functions in the text report"),
+    admin = Depends(get_current_admin),
+) -> Response:
+    record = profile_buffer.get(profile_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    if file_format == "pstats":
+        return Response(
+            record.as_pstats(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+        )
+    if file_format != "text":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Wrong format. The format must be either text or pstats"
+        )
+    try:
+        return PlainTextResponse(record.as_text(sort_by, limit))
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown sort key {sort_by}"
+        )
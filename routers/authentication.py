@@ -2,7 +2,15 @@ import secrets
 
 from db.database import get_session
 from db.models import User
-from dependencies import get_current_user
+from db.repository import UserRepository
+from dependencies import (
+    INACTIVE_TOKEN_VERSION,
+    TokenClaims,
+    get_current_claims,
+    get_current_user,
+    token_versions,
+    user_cache
+)
 from fastapi import (
     APIRouter, 
     Depends, 
@@ -11,6 +19,12 @@ from fastapi import (
     Response, 
     status
 )
+from hashers import needs_rehash
+from ratelimit import (
+    LoginThrottle,
+    get_login_throttle
+)
+from revocation import revocation_list
 from schemas.users import (
     UserLogin,
     UserRegister,
@@ -18,12 +32,11 @@ from schemas.users import (
 )
 from security import (
     create_access_token,
-    hash_password, 
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     EXPIRE_ACCESS_TOKEN_MINUTES,
     verify_token
 )
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
@@ -35,8 +48,7 @@ async def register(
     user: UserRegister,
     db: AsyncSession = Depends(get_session)
 ) -> dict[str, str]:
-    user_exist = await db.execute(select(User).where(User.email == user.email))
-    if user_exist.scalar_one_or_none():
+    if await UserRepository(db).email_exists(user.email):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="A user with this email already exists"
@@ -50,7 +62,7 @@ async def register(
     db_user = User(
         username=user.username,
         email=user.email,
-        password=hash_password(user.password),
+        password=await hash_password_async(user.password),
     )
     db.add(db_user)
     await db.commit()
@@ -63,16 +75,19 @@ async def login(
     user: UserLogin, 
     response: Response, 
     request: Request,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_session),
+    throttle: LoginThrottle = Depends(get_login_throttle)
 ) -> dict[str, str]:
+    # Runs before any database query or password hashing.
+    await throttle.check(request.client.host if request.client else "unknown", user.email)
+    
     existing_token =  request.cookies.get("access_token")
     if existing_token:
         try:
             payload = verify_token(existing_token)
-            if payload:
-                result = await db.execute(select(User).where(User.email == payload.get("sub")))
-                db_user = result.scalar_one_or_none()
-                if db_user and db_user.is_active:
+            if payload and not await revocation_list.is_revoked(payload.get("jti", "")):
+                db_user = await UserRepository(db).get_by_email(payload.get("sub"))
+                if db_user and db_user.is_active and payload.get("tv") == db_user.token_version:
                     return {"message": "You are already logged in"}
         except Exception:
             response.delete_cookie(
@@ -80,15 +95,14 @@ async def login(
                 httponly=True,
                 secure=True
             )
-    result = await db.execute(select(User).where(User.email == user.email))
-    db_user = result.scalar_one_or_none()
+    db_user = await UserRepository(db).get_by_email(user.email)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid login or password"
         )
     
-    if not verify_password(user.password, db_user.password):
+    if not await verify_password_async(user.password, db_user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid login or password"
@@ -100,7 +114,18 @@ async def login(
             detail="User inactive"
         )
     
-    payload = {"sub": db_user.email}
+    await throttle.reset(db_user.email)
+    if needs_rehash(db_user.password):
+        db_user.password = await hash_password_async(user.password)
+        await db.commit()
+        user_cache.pop(db_user.email)
+    
+    payload = {
+        "sub": db_user.email,
+        "uid": db_user.id,
+        "role": db_user.role,
+        "tv": db_user.token_version
+    }
     token = create_access_token(payload)
     response.set_cookie(
         key="access_token",
@@ -118,10 +143,14 @@ async def update_user(
     current_user: User = Depends(get_current_user), 
     db: AsyncSession = Depends(get_session)
 ) -> UserUpdate:
+    # The current user may come from the cache, so write through a row that
+    # belongs to this session.
+    db_user = await db.get(User, current_user.id)
     for field, value in update_data.model_dump(exclude_unset=True).items():
-        setattr(current_user, field, value)
+        setattr(db_user, field, value)
         
     await db.commit()
+    user_cache.pop(current_user.email)
     return UserUpdate(
         new_username=update_data.new_username,
         new_email=update_data.new_email,
@@ -131,10 +160,19 @@ async def update_user(
 @router.post("/logout")
 async def logout_user(
     response: Response,
-    request: Request
+    request: Request,
+    db: AsyncSession = Depends(get_session)
 ) -> dict[str, str]:
-    if not request.cookies.get("access_token"):
+    token = request.cookies.get("access_token")
+    if not token:
         return {"message": "You are not authenticated"}
+    try:
+        payload = verify_token(token)
+    except Exception:
+        payload = None
+    if payload and "jti" in payload:
+        await revocation_list.revoke(db, payload["jti"], payload["exp"])
+        await db.commit()
     response.delete_cookie(
         key="access_token",
         httponly=True,
@@ -146,7 +184,7 @@ async def logout_user(
 @router.delete("/delete")
 async def delete_me(
     response: Response,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_current_claims),
     db: AsyncSession = Depends(get_session)
 ):
     if current_user.role == "superadmin":
@@ -154,8 +192,13 @@ async def delete_me(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You are a superadmin and cannot be deactivated"
         )
-    current_user.is_active = False
+    db_user = await db.get(User, current_user.id)
+    db_user.is_active = False
+    db_user.token_version += 1
+    await revocation_list.revoke(db, current_user.jti, current_user.exp)
     response.delete_cookie(key="access_token")
     await db.commit()
+    token_versions.set(current_user.id, INACTIVE_TOKEN_VERSION)
+    user_cache.pop(current_user.email)
     return {"message": "Delete successfully!"}
     
\ No newline at end of file
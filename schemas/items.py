@@ -1,9 +1,14 @@
-from pydantic import BaseModel
+from pydantic import (
+    BaseModel,
+    ConfigDict
+)
 
 
 class ItemCreate(BaseModel):
     name: str
     description: str
+    
+    model_config = ConfigDict(from_attributes=True)
    
     
 class ItemResponse(ItemCreate):
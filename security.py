@@ -1,38 +1,195 @@
-import bcrypt
+import asyncio
 import datetime
+import hashlib
 import jwt 
+import secrets
+import time
 
+from cache import TTLCache
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
 from config import settings
+from fastapi import (
+    HTTPException,
+    status
+)
 from fastapi.security import HTTPBearer
+from functools import (
+    cache,
+    partial
+)
+from hashers import (
+    default_hasher,
+    identify_hasher
+)
+from keys import KeyRing
+from metrics import (
+    FAST_LATENCY_BUCKETS,
+    registry
+)
 
 
 http_bearer = HTTPBearer()
 EXPIRE_ACCESS_TOKEN_MINUTES = 30
 
+# Verified payloads keyed by sha256(token), each evicted at the token's exp.
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=60*EXPIRE_ACCESS_TOKEN_MINUTES
+)
+
+
+jwt_seconds = registry.histogram(
+    "jwt_seconds",
+    "Time to sign or verify an access token; cache hits are not counted",
+    ("operation",),
+    FAST_LATENCY_BUCKETS
+)
+password_hash_seconds = registry.histogram(
+    "password_hash_seconds",
+    "Time spent hashing or verifying one password in the hashing pool",
+    ("operation",)
+)
+password_hash_wait_seconds = registry.histogram(
+    "password_hash_wait_seconds",
+    "Time a hashing job waited for a free worker in the hashing pool",
+    ("operation",)
+)
+
+
+# HS* algorithms keep using the shared JWT_SECRET_KEY; asymmetric ones sign
+# with key objects parsed once (main.lifespan loads them at startup) and
+# publish the public halves as JWKS.
+@cache
+def get_key_ring() -> KeyRing | None:
+    if settings.JWT_ALGORITHM.startswith("HS"):
+        return None
+    return KeyRing.load(settings.JWT_KEYS_DIR, settings.JWT_ALGORITHM, settings.JWT_ACTIVE_KID)
+
 
 def create_access_token(payload: dict) -> str:
     data = payload.copy()
     data["exp"] = datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=EXPIRE_ACCESS_TOKEN_MINUTES)
     data["iat"] = datetime.datetime.now(tz=datetime.timezone.utc)
-    token = jwt.encode(payload=data, key=settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    data["jti"] = secrets.token_urlsafe(16)
+    key_ring = get_key_ring()
+    start = time.perf_counter()
+    if key_ring is None:
+        token = jwt.encode(payload=data, key=settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    else:
+        token = jwt.encode(
+            payload=data,
+            key=key_ring.active.private_key,
+            algorithm=key_ring.active.algorithm,
+            headers={"kid": key_ring.active.kid}
+        )
+    jwt_seconds.labels("encode").observe(time.perf_counter() - start)
     
     return token
 
 
 def verify_token(token: str) -> dict:
+    cache_key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        return dict(payload)
+    start = time.perf_counter()
     try:
-        payload = jwt.decode(token, key=settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return payload
+        key_ring = get_key_ring()
+        if key_ring is None:
+            key = settings.JWT_SECRET_KEY
+        else:
+            key = key_ring.public_key(jwt.get_unverified_header(token).get("kid"))
+        payload = jwt.decode(token, key=key, algorithms=[settings.JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise Exception("Token invalid")
-    except jwt.InvalidTokenError:
+    except (jwt.InvalidTokenError, KeyError):
         raise Exception("Token invalid")
+    finally:
+        jwt_seconds.labels("decode").observe(time.perf_counter() - start)
+    if "exp" in payload:
+        token_cache.set(cache_key, payload, ttl=payload["exp"] - time.time())
+    return dict(payload)
 
 
 def hash_password(password: str) -> bytes:
-    return bcrypt.hashpw(password=password.encode(), salt=bcrypt.gensalt())
+    return default_hasher.hash(password)
 
 
 def verify_password(password: str, hashed_password: bytes) -> bool:
-    return bcrypt.checkpw(password=password.encode(), hashed_password=hashed_password)
+    return identify_hasher(hashed_password).verify(password, hashed_password)
+
+
+def _timed_call(func, *args):
+    # Runs in the worker, so with the process executor the duration still
+    # reaches the parent's metrics.
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHashingPool:
+    def __init__(self, kind: str, max_workers: int, max_queue: int) -> None:
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def run(self, operation: str, func, *args):
+        # Everything above max_workers waits in the executor queue; past
+        # max_queue we shed load instead of letting latency grow unbounded.
+        if self._pending >= self.max_workers + self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"}
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            result, elapsed = await loop.run_in_executor(self._get_executor(), partial(_timed_call, func, *args))
+            password_hash_seconds.labels(operation).observe(elapsed)
+            password_hash_wait_seconds.labels(operation).observe(max(time.perf_counter() - start - elapsed, 0.0))
+            return result
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hashing_pool = PasswordHashingPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+
+async def hash_password_async(password: str) -> bytes:
+    return await password_hashing_pool.run("hash", hash_password, password)
+
 
+async def verify_password_async(password: str, hashed_password: bytes) -> bool:
+    return await password_hashing_pool.run("verify", verify_password, password, hashed_password)